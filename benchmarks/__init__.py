@@ -0,0 +1 @@
+"""Throughput benchmarks: ``python -m benchmarks --help``."""
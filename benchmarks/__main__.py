@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import cv2
+
+from .corpus import CORPUS_FORMATS, generate_corpus, parse_sizes
+from .mock_ollama import MockOllamaServer
+from .scenarios import SCENARIOS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Measure pipeline throughput on a synthetic corpus against a mock Ollama server.")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run ({', '.join(SCENARIOS)})")
+    parser.add_argument('-o', '--output', default=None, help="Write the JSON report here instead of stdout")
+
+    corpus = parser.add_argument_group("Synthetic corpus")
+    corpus.add_argument('--images', type=int, default=200)
+    corpus.add_argument('--sizes', default='1024x768,1920x1080', help="Comma-separated WIDTHxHEIGHT, cycled through")
+    corpus.add_argument('--formats', default=','.join(CORPUS_FORMATS), help="Comma-separated file formats, cycled through")
+    corpus.add_argument('--face-ratio', type=float, default=0.7, help="Fraction of images that contain a face")
+    corpus.add_argument('--seed', type=int, default=0)
+    corpus.add_argument('--corpus-dir', default=None,
+                        help="Generate the corpus here and keep it (default: a temporary directory)")
+
+    server = parser.add_argument_group("Mock Ollama server")
+    server.add_argument('--latency', type=float, default=0.05, help="Seconds per generate request")
+    server.add_argument('--jitter', type=float, default=0.02, help="Random +/- seconds added to the latency")
+    server.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 500")
+
+    pipeline = parser.add_argument_group("Pipeline")
+    pipeline.add_argument('--detector', default='haar')
+    pipeline.add_argument('--detect-workers', type=int, default=None)
+    pipeline.add_argument('--ai-workers', type=int, default=None)
+    pipeline.add_argument('--write-workers', type=int, default=None)
+    pipeline.add_argument('--memory-budget-mb', type=int, default=None)
+    return parser
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, corpus_dir):
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}'")
+    print(f"Generating {args.images} images in {corpus_dir}...", file=sys.stderr)
+    generate_corpus(corpus_dir, args.images, parse_sizes(args.sizes), args.formats.split(','),
+                    args.face_ratio, args.seed)
+    results = []
+    with MockOllamaServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          seed=args.seed) as server:
+        for name in scenarios:
+            print(f"Running {name}...", file=sys.stderr)
+            # A fresh interpreter per scenario keeps peak RSS and warm caches separate
+            command = [sys.executable, '-m', 'benchmarks.scenarios', name, '--corpus', corpus_dir,
+                       '--url', server.url, '--detector', args.detector]
+            for option in ('detect_workers', 'ai_workers', 'write_workers', 'memory_budget_mb'):
+                if getattr(args, option) is not None:
+                    command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+            requests_before = server.requests
+            output = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True)
+            if output.returncode != 0:
+                raise SystemExit(f"Scenario {name} failed:\n{output.stderr}")
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            result['server_requests'] = server.requests - requests_before
+            results.append(result)
+            print(f"  {result['images_per_sec']} images/s, p50 {result['latency_p50_ms']} ms, "
+                  f"p95 {result['latency_p95_ms']} ms", file=sys.stderr)
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'corpus_dir')},
+        'results': results
+    }
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.corpus_dir:
+        report = run(args, args.corpus_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="bench-corpus-") as corpus_dir:
+            report = run(args, corpus_dir)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
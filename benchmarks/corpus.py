@@ -0,0 +1,79 @@
+import os
+import random
+import cv2
+import numpy as np
+
+CORPUS_FORMATS = ('jpg', 'png', 'webp')
+
+
+def parse_sizes(text):
+    """``"640x480,1920x1080"`` -> ``[(640, 480), (1920, 1080)]``."""
+    sizes = []
+    for item in text.split(','):
+        width, height = item.lower().strip().split('x')
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def _background(rng, width, height):
+    # Smooth colour gradient plus sensor-like noise, so encoders have realistic work
+    start = np.array([rng.randint(40, 220) for _ in range(3)], np.float32)
+    end = np.array([rng.randint(40, 220) for _ in range(3)], np.float32)
+    ramp = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    image = np.broadcast_to(start + (end - start) * ramp, (height, width, 3)).copy()
+    noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, 6, (height, width, 3))
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def _draw_face(rng, image):
+    # A frontal cartoon face that the default Haar cascade (the "haar" backend) detects reliably
+    height, width = image.shape[:2]
+    size = int(min(width, height) * rng.uniform(0.35, 0.7))
+    cx = rng.randint(size // 2, width - size // 2)
+    cy = rng.randint(size // 2, height - size // 2)
+    skin = (rng.randint(110, 190), rng.randint(140, 200), rng.randint(180, 235))
+    cv2.ellipse(image, (cx, cy), (int(size * .28), int(size * .36)), 0, 0, 360, skin, -1)
+    for dx in (-1, 1):
+        cv2.ellipse(image, (cx + dx * int(size * .11), cy - int(size * .08)), (int(size * .06), int(size * .03)),
+                    0, 0, 360, (40, 40, 40), -1)
+        cv2.line(image, (cx + dx * int(size * .05), cy - int(size * .15)), (cx + dx * int(size * .17), cy - int(size * .15)),
+                 (50, 50, 50), max(2, size // 60))
+    cv2.line(image, (cx, cy - int(size * .03)), (cx, cy + int(size * .08)), (110, 120, 160), max(2, size // 80))
+    cv2.ellipse(image, (cx, cy + int(size * .17)), (int(size * .09), int(size * .03)), 0, 0, 360, (60, 60, 140), -1)
+    return cv2.GaussianBlur(image, (0, 0), max(1, size / 200))
+
+
+def _draw_shapes(rng, image):
+    height, width = image.shape[:2]
+    for _ in range(rng.randint(3, 8)):
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        x, y = rng.randrange(width), rng.randrange(height)
+        if rng.random() < 0.5:
+            cv2.rectangle(image, (x, y), (x + rng.randint(10, width // 3), y + rng.randint(10, height // 3)), color, -1)
+        else:
+            cv2.circle(image, (x, y), rng.randint(5, min(width, height) // 5), color, -1)
+    return image
+
+
+def generate_corpus(directory, count, sizes=((1024, 768),), formats=CORPUS_FORMATS, face_ratio=0.7, seed=0):
+    """Write ``count`` synthetic images to ``directory`` and return their paths.
+
+    Sizes and formats are cycled through; ``face_ratio`` of the images get a
+    face, the rest only background and shapes. The same seed gives the same
+    corpus, so runs on different versions see identical inputs.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        image_format = formats[i % len(formats)]
+        image = _draw_shapes(rng, _background(rng, width, height))
+        has_face = rng.random() < face_ratio
+        if has_face:
+            image = _draw_face(rng, image)
+        path = os.path.join(directory, f"{'face' if has_face else 'scene'}_{i:06d}.{image_format}")
+        if not cv2.imwrite(path, image):
+            raise ValueError(f"OpenCV cannot write {image_format} images")
+        paths.append(path)
+    return paths
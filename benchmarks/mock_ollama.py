@@ -0,0 +1,153 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_MODEL = 'mock-llava:latest'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, chunk):
+        data = json.dumps(chunk).encode('utf-8') + b'\n'
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send(200, json.dumps({'models': [{'name': MOCK_MODEL,
+                                                    'details': {'families': ['llama', 'clip']}}]}))
+        elif self.path == '/':
+            self._send(200, 'Ollama is running', 'text/plain')
+        else:
+            self._send(404, json.dumps({'error': 'not found'}))
+
+    def do_POST(self):
+        if self.path != '/api/generate':
+            self._send(404, json.dumps({'error': 'not found'}))
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        server = self.server
+        server.count_request(len(payload.get('images', [])))
+        time.sleep(server.delay())
+        if server.should_fail():
+            self._send(500, json.dumps({'error': 'mock failure'}))
+            return
+        words = _response_text(payload).split(' ')
+        if not payload.get('stream', True):
+            self._send(200, json.dumps({'model': payload.get('model'), 'response': ' '.join(words), 'done': True}))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for i, word in enumerate(words):
+                self._write_chunk({'response': word if i == len(words) - 1 else word + ' ', 'done': False})
+                if server.token_interval:
+                    time.sleep(server.token_interval)
+            self._write_chunk({'response': '', 'done': True, 'eval_count': len(words)})
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early, as validation does once it has its answer
+            pass
+
+
+def _response_text(payload):
+    response_format = payload.get('format')
+    if isinstance(response_format, dict):
+        properties = response_format.get('properties', {})
+        if 'verdicts' in properties:
+            return json.dumps({'verdicts': [{'index': i, 'face': True} for i in range(len(payload.get('images', [])))]})
+        return json.dumps({'face': True, 'tags': ['portrait', 'person', 'indoor', 'smiling']})
+    if 'face' in payload.get('prompt', '').lower():
+        return 'yes'
+    return 'portrait, person, indoor lighting, smiling, close-up'
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """Local stand-in for Ollama's ``/api/generate`` and ``/api/tags``.
+
+    Every generate request waits ``latency`` seconds plus up to ``jitter``
+    either way, then fails with a 500 at ``error_rate`` or streams a canned
+    answer that fits the request (yes/no, caption, or the JSON schemas the
+    engine asks for). Use as a context manager to serve on a background
+    thread; port 0 picks a free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, jitter=0.0, error_rate=0.0, token_interval=0.0, seed=0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_interval = token_interval
+        self.requests = 0
+        self.images = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count_request(self, images):
+        with self._lock:
+            self.requests += 1
+            self.images += images
+
+    def delay(self):
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.mock_ollama",
+                                     description="Serve a mock Ollama API until interrupted.")
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds per generate request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Random +/- seconds added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument('--token-interval', type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    server = MockOllamaServer(args.port, args.latency, args.jitter, args.error_rate, args.token_interval, args.seed)
+    print(f"Mock Ollama listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from model.engine import ProcessingEngine
+from model.memory_budget import peak_rss_mb, resource
+
+# Engine switches per scenario: (ai_validation, generate_captions, combined_request)
+SCENARIOS = {
+    'detection': (False, False, False),
+    'validation': (True, False, False),
+    'captioning': (False, True, False),
+    'combined': (True, True, True)
+}
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile; None for an empty list
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def run_scenario(name, corpus_dir, url, detect_workers=None, ai_workers=None, write_workers=None,
+                 detector='haar', caption_limit=60, memory_budget_mb=2048):
+    """Process ``corpus_dir`` once with the scenario's settings and return its measurements."""
+    ai_validation, generate_captions, combined_request = SCENARIOS[name]
+    engine = ProcessingEngine()
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as output_dir:
+        engine.set_parameters([corpus_dir], output_dir, 0, 0, generate_captions, caption_limit, ai_validation, True)
+        engine.set_api_params({'url': url})
+        engine.set_model('mock-llava:latest')
+        engine.set_pipeline_params(detect_workers, ai_workers, write_workers)
+        engine.set_memory_params(memory_budget_mb)
+        engine.set_detection_params(detector_backend=detector)
+        engine.set_request_params(combined_request=combined_request)
+        # Every request should reach the mock server
+        engine.set_cache_params(enabled=False)
+        started = {}
+        latencies = []
+
+        def image_started(image_path):
+            # Results are reported by file name; corpus names are unique
+            started[os.path.basename(image_path)] = time.perf_counter()
+
+        engine.on_image_started = image_started
+        stats = {}
+        engine.on_finished = stats.update
+        begin = time.perf_counter()
+        for image_file, *_ in engine.results():
+            if image_file in started:
+                latencies.append(time.perf_counter() - started.pop(image_file))
+        elapsed = time.perf_counter() - begin
+    images = len(latencies)
+    return {
+        'scenario': name,
+        'images': images,
+        'seconds': round(elapsed, 3),
+        'images_per_sec': round(images / elapsed, 2) if elapsed else None,
+        'latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_children_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        'stats': {key: value for key, value in stats.items() if key != 'endpoints'}
+    }
+
+
+def main(argv=None):
+    # Entry point for one scenario per process, so peak RSS is not shared between scenarios
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.scenarios")
+    parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    parser.add_argument('--corpus', required=True)
+    parser.add_argument('--url', required=True)
+    parser.add_argument('--detector', default='haar')
+    parser.add_argument('--detect-workers', type=int, default=None)
+    parser.add_argument('--ai-workers', type=int, default=None)
+    parser.add_argument('--write-workers', type=int, default=None)
+    parser.add_argument('--memory-budget-mb', type=int, default=2048)
+    args = parser.parse_args(argv)
+    result = run_scenario(args.scenario, args.corpus, args.url, args.detect_workers, args.ai_workers,
+                          args.write_workers, args.detector, memory_budget_mb=args.memory_budget_mb)
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
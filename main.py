@@ -8,4 +8,6 @@ if __name__ == '__main__':
     image_processor = ImageProcessor()
     main_window = MainWindow(image_processor)
     main_window.show()
+    # OpenCV and requests are imported behind the visible window, ready by the time a run starts
+    image_processor.preload()
     sys.exit(app.exec_())
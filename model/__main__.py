@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import sys
+
+from .detection import DETECTOR_BACKENDS, available_backends
+from .engine import ProcessingEngine
+from .options import DEDUP_MODES, OUTPUT_FORMATS
+from .shards import EXPORT_MODES
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m model",
+                                     description="Detect, crop and caption portraits without the GUI.")
+    parser.add_argument('folders', nargs='+', help="Input folders to process")
+    parser.add_argument('-o', '--output-dir', required=True, help="Directory for processed images")
+    parser.add_argument('--min-width', type=int, default=0)
+    parser.add_argument('--min-height', type=int, default=0)
+    parser.add_argument('--generate-captions', action='store_true')
+    parser.add_argument('--caption-limit', type=int, default=None)
+    parser.add_argument('--ai-validation', action='store_true')
+    parser.add_argument('--crop-faces', action='store_true')
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip inputs the output manifest already records as finished with the same settings")
+    parser.add_argument('--recursive', action='store_true', help="Also process images in subfolders")
+
+    watch = parser.add_argument_group("Watch mode")
+    watch.add_argument('--watch', action='store_true',
+                       help="Keep running and process new or changed images as they appear (Ctrl+C to stop)")
+    watch.add_argument('--watch-debounce', type=float, default=2.0,
+                       help="Seconds a file must stay unchanged before it is processed")
+    watch.add_argument('--watch-poll-interval', type=float, default=1.0,
+                       help="Seconds between directory checks when inotify is unavailable")
+
+    api = parser.add_argument_group("API parameters")
+    api.add_argument('--url', default='http://localhost:11434')
+    api.add_argument('--endpoint', action='append', default=[], dest='endpoints',
+                     help="Additional Ollama base URL to balance requests over (repeatable)")
+    api.add_argument('--generate-uri', default='/api/generate')
+    api.add_argument('--model', default=None)
+    api.add_argument('--prompt', default=None)
+    api.add_argument('--temperature', default='0.7')
+    api.add_argument('--max-tokens', default='1000')
+    api.add_argument('--top-p', default='1')
+    api.add_argument('--frequency-penalty', default='0')
+    api.add_argument('--presence-penalty', default='0')
+    api.add_argument('--timeout', default='120', help="Seconds to wait for a response")
+    api.add_argument('--max-retries', default='3', help="Retries on connection errors, timeouts and 5xx")
+    api.add_argument('--max-in-flight', default='4', help="Maximum concurrent requests to Ollama")
+
+    detection = parser.add_argument_group("Face detection")
+    detection.add_argument('--detector', choices=sorted(DETECTOR_BACKENDS), default='haar')
+    detection.add_argument('--detect-batch-size', type=int, default=4)
+    detection.add_argument('--detection-scale', type=int, choices=[1, 2, 4, 8], default=1,
+                           help="Decode at 1/N resolution for detection; full resolution is only decoded for crops")
+    detection.add_argument('--detection-max-edge', type=int, default=0,
+                           help="Downscale the detection image to this long edge in pixels (0 = off)")
+
+    payload = parser.add_argument_group("Image payload")
+    payload.add_argument('--payload-max-edge', type=int, default=1024,
+                         help="Downscale images sent to Ollama to this long edge (0 = original size)")
+    payload.add_argument('--payload-format', choices=['jpeg', 'webp'], default='jpeg')
+    payload.add_argument('--payload-quality', type=int, default=90)
+
+    output = parser.add_argument_group("Output encoding")
+    output.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='source',
+                        help="Format of the exported images ('source' keeps each input's format)")
+    output.add_argument('--output-quality', type=int, default=95, help="JPEG and WebP quality (1-100)")
+    output.add_argument('--png-compression', type=int, choices=range(10), default=1, metavar='0-9',
+                        help="PNG compression level; higher is smaller and slower")
+
+    export = parser.add_argument_group("Export")
+    export.add_argument('--export', choices=EXPORT_MODES, default='files', dest='export_mode',
+                        help="Write loose image and caption files, or WebDataset tar shards under OUTPUT_DIR/shards")
+    export.add_argument('--shard-max-mb', type=int, default=1024, help="Start a new shard beyond this size")
+
+    strategy = parser.add_argument_group("Request strategy")
+    strategy.add_argument('--combined-request', action='store_true',
+                          help="Validate and caption with one JSON request when both are enabled")
+    strategy.add_argument('--validation-batch-size', type=int, default=1,
+                          help="Validate this many images per multi-image request")
+
+    dedup = parser.add_argument_group("Near-duplicates")
+    dedup.add_argument('--dedup', choices=DEDUP_MODES, default='off',
+                       help="Skip near-duplicate inputs, or reuse the earlier copy's result")
+    dedup.add_argument('--dedup-distance', type=int, default=4,
+                       help="Maximum perceptual hash distance in bits that counts as a duplicate")
+
+    cache = parser.add_argument_group("Response cache")
+    cache.add_argument('--no-cache', action='store_true', help="Always query Ollama")
+    cache.add_argument('--cache-path', default=None)
+    cache.add_argument('--cache-max-size-mb', type=int, default=256)
+    cache.add_argument('--cache-max-age-days', type=int, default=30)
+
+    metrics = parser.add_argument_group("Metrics")
+    metrics.add_argument('--prometheus-file', default=None,
+                         help="Keep this Prometheus textfile (for the node exporter) updated during the run")
+    metrics.add_argument('--profile', default=None, help="Profile the run's threads with cProfile and write the stats here")
+    metrics.add_argument('--metrics-interval', type=float, default=1.0, help="Seconds between metrics updates")
+    metrics.add_argument('--no-run-report', action='store_true',
+                         help="Do not write run_report.json to the output directory")
+
+    pipeline = parser.add_argument_group("Pipeline")
+    pipeline.add_argument('--detect-workers', type=int, default=None)
+    pipeline.add_argument('--ai-workers', type=int, default=None)
+    pipeline.add_argument('--write-workers', type=int, default=None)
+    pipeline.add_argument('--memory-budget-mb', type=int, default=2048,
+                          help="Cap on the estimated decoded image data in flight; 0 for no limit")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.detector not in available_backends():
+        parser.error(f"Detector '{args.detector}' is not available in this OpenCV build")
+
+    engine = ProcessingEngine()
+    engine.set_parameters(args.folders, args.output_dir, args.min_width, args.min_height,
+                          args.generate_captions, args.caption_limit, args.ai_validation, args.crop_faces)
+    api_params = {
+        'url': args.url,
+        'endpoints': args.endpoints,
+        'generate_uri': args.generate_uri,
+        'temperature': args.temperature,
+        'max_tokens': args.max_tokens,
+        'top_p': args.top_p,
+        'frequency_penalty': args.frequency_penalty,
+        'presence_penalty': args.presence_penalty,
+        'timeout': args.timeout,
+        'max_retries': args.max_retries,
+        'max_in_flight': args.max_in_flight
+    }
+    if args.prompt is not None:
+        api_params['prompt'] = args.prompt
+    engine.set_api_params(api_params)
+    engine.set_model(args.model)
+    engine.set_pipeline_params(args.detect_workers, args.ai_workers, args.write_workers)
+    engine.set_memory_params(args.memory_budget_mb)
+    engine.set_detection_params(args.detection_scale, args.detection_max_edge, args.detector, args.detect_batch_size)
+    engine.set_payload_params(args.payload_max_edge, args.payload_format, args.payload_quality)
+    engine.set_output_params(args.output_format, args.output_quality, args.png_compression)
+    engine.set_export_params(args.export_mode, args.shard_max_mb)
+    engine.set_request_params(args.combined_request, args.validation_batch_size)
+    engine.set_dedup_params(args.dedup, args.dedup_distance)
+    engine.set_resume(args.resume)
+    engine.set_scan_params(args.recursive)
+    engine.set_watch_params(args.watch, args.watch_debounce, args.watch_poll_interval)
+    engine.set_metrics_params(args.prometheus_file, args.profile, args.metrics_interval, not args.no_run_report)
+    engine.set_cache_params(not args.no_cache, args.cache_path, args.cache_max_size_mb, args.cache_max_age_days)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stats = {}
+    engine.on_finished = stats.update
+
+    # Results are streamed as one JSON object per line; the summary goes to stderr
+    results = engine.results()
+    try:
+        for image_file, success, reason, cropped, ai_response in results:
+            print(json.dumps({
+                'image': image_file,
+                'success': success,
+                'reason': reason,
+                'cropped': cropped,
+                'ai_response': ai_response
+            }), flush=True)
+    except KeyboardInterrupt:
+        # Stops the engine and waits for in-flight images, which also ends watch mode
+        results.close()
+    print(json.dumps({'stats': stats}), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def default_cache_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'ollama-portrait-export', 'responses.sqlite3')
+
+
+def make_cache_key(image_data, model, prompt, options, response_format=None):
+    # Content-addressed: the same pixels, model, prompt and options map to the same entry
+    if isinstance(image_data, str):
+        image_data = image_data.encode('utf-8')
+    image_hash = hashlib.sha256(image_data).hexdigest()
+    request = {'model': model, 'prompt': prompt, 'options': options}
+    if response_format is not None:
+        request['format'] = response_format
+    request = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(f"{image_hash}\n{request}".encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Persistent SQLite cache of Ollama responses with size and age eviction."""
+
+    EVICT_EVERY = 100
+
+    def __init__(self, path=None, max_size_mb=256, max_age_days=30):
+        self.path = path or default_cache_path()
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._puts = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age and row[1] < now - self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, response, size, created, accessed) "
+                               "VALUES (?, ?, ?, ?, ?)", (key, response, len(response.encode('utf-8')), now, now))
+            self._conn.commit()
+            self._puts += 1
+            evict = self._puts % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            if self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            if self.max_bytes:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    # Drop least recently used entries until the cache fits again
+                    removed = 0
+                    doomed = []
+                    for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                        if total - removed <= self.max_bytes:
+                            break
+                        doomed.append((key,))
+                        removed += size
+                    self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,93 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from .detection import available_backends, create_detector, load_detection_image
+
+LABEL_DIRS = {'face': True, 'faces': True, 'no_face': False, 'no_faces': False}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def load_sample(folder):
+    """Collect ``(path, label)`` pairs; labels come from face/ and no_face/ subfolders, else None."""
+    sample = []
+    labelled = [name for name in LABEL_DIRS if os.path.isdir(os.path.join(folder, name))]
+    sources = [(os.path.join(folder, name), LABEL_DIRS[name]) for name in labelled] or [(folder, None)]
+    for directory, label in sources:
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                sample.append((os.path.join(directory, file_name), label))
+    return sample
+
+
+def compare_backends(sample, backends, detection_scale=1, detection_max_edge=0, batch_size=8):
+    images = []
+    for path, label in sample:
+        gray, scale, _ = load_detection_image(path, detection_scale, detection_max_edge)
+        if gray is not None:
+            images.append((path, label, gray, max(24, round(30 / scale))))
+
+    report = {'images': len(images), 'backends': {}, 'agreement': {}}
+    verdicts = {}
+    for backend in backends:
+        detector = create_detector(backend)
+        found = []
+        # Decoding is shared, so the timing covers detection only
+        start = time.perf_counter()
+        for i in range(0, len(images), batch_size):
+            batch = images[i:i + batch_size]
+            found.extend(detector.detect_batch([gray for _, _, gray, _ in batch], [size for _, _, _, size in batch]))
+        elapsed = time.perf_counter() - start
+        verdicts[backend] = [bool(faces) for faces in found]
+
+        entry = {
+            'seconds': round(elapsed, 3),
+            'images_per_sec': round(len(images) / elapsed, 2) if elapsed > 0 else None,
+            'faces_found': sum(verdicts[backend])
+        }
+        labels = [label for _, label, _, _ in images]
+        positives = [v for v, label in zip(verdicts[backend], labels) if label is True]
+        negatives = [v for v, label in zip(verdicts[backend], labels) if label is False]
+        if positives:
+            entry['recall'] = round(sum(positives) / len(positives), 3)
+        if negatives:
+            entry['false_positive_rate'] = round(sum(negatives) / len(negatives), 3)
+        if positives or negatives:
+            entry['accuracy'] = round((sum(positives) + len(negatives) - sum(negatives))
+                                      / (len(positives) + len(negatives)), 3)
+        report['backends'][backend] = entry
+
+    for a, b in itertools.combinations(backends, 2):
+        same = sum(1 for x, y in zip(verdicts[a], verdicts[b]) if x == y)
+        report['agreement'][f"{a}/{b}"] = round(same / len(images), 3) if images else None
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m model.compare_detectors",
+                                     description="Compare face detector backends for speed and agreement. "
+                                                 "Put labelled images in face/ and no_face/ subfolders to get "
+                                                 "recall and false positive rates.")
+    parser.add_argument('folder')
+    parser.add_argument('--backends', nargs='+', default=None, help="Defaults to every available backend")
+    parser.add_argument('--detection-scale', type=int, choices=[1, 2, 4, 8], default=1)
+    parser.add_argument('--detection-max-edge', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    backends = args.backends or available_backends()
+    missing = [backend for backend in backends if backend not in available_backends()]
+    if missing:
+        parser.error(f"Backends not available in this OpenCV build: {', '.join(missing)}")
+
+    report = compare_backends(load_sample(args.folder), backends, args.detection_scale,
+                              args.detection_max_edge, args.batch_size)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+
+import cv2
+
+
+def dhash(gray, hash_size=8):
+    """64-bit difference hash: compares neighbouring pixels of a 9x8 downsample."""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def image_dhash(path):
+    # A 1/8 scale decode is plenty for a 9x8 hash and skips most of the JPEG decode
+    gray = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    return dhash(gray)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes for Hamming-distance range queries."""
+
+    def __init__(self):
+        self.root = None  # [hash, item, {distance: child}]
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, item, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, item, {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """Return ``(distance, hash, item)`` for every entry within ``max_distance``."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.append((distance, node[0], node[1]))
+            # Triangle inequality: only subtrees in this band can hold matches
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class DuplicateIndex:
+    """Perceptual hashes of the images handled in an output directory.
+
+    Finished entries are stored in ``dedup.sqlite3`` next to the output and
+    loaded into a BK-tree on start, so new inputs are matched against
+    everything exported before. ``match`` claims a hash for an image as
+    soon as it is seen, so copies within the same run are caught while the
+    first one is still being processed; ``wait`` blocks until its outcome
+    is known. Entries remember the settings fingerprint they were produced
+    under, and only entries with the current ``fingerprint`` are matched.
+    """
+
+    FILE_NAME = 'dedup.sqlite3'
+
+    def __init__(self, output_dir, fingerprint=""):
+        self.path = os.path.join(output_dir, self.FILE_NAME)
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._tree = BKTree()
+        # path -> {'hash', 'outcome', 'reason', 'ai_response', 'was_cropped', 'fingerprint'}; outcome None while in flight
+        self._entries = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                path TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                ai_response TEXT NOT NULL,
+                was_cropped INTEGER NOT NULL DEFAULT 0,
+                fingerprint TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        # Indexes from before these columns existed; their entries never match a fingerprint
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(hashes)")}
+        for column, definition in (('was_cropped', "INTEGER NOT NULL DEFAULT 0"),
+                                   ('fingerprint', "TEXT NOT NULL DEFAULT ''")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE hashes ADD COLUMN {column} {definition}")
+        self._conn.commit()
+        rows = self._conn.execute("SELECT path, hash, outcome, reason, ai_response, was_cropped, fingerprint FROM hashes")
+        for path, value, outcome, reason, ai_response, was_cropped, fingerprint in rows:
+            self._add(path, int(value, 16), outcome, reason, ai_response, bool(was_cropped), fingerprint)
+
+    def _add(self, path, value, outcome=None, reason="", ai_response="", was_cropped=False, fingerprint=None):
+        self._entries[path] = {'hash': value, 'outcome': outcome, 'reason': reason, 'ai_response': ai_response,
+                               'was_cropped': was_cropped,
+                               'fingerprint': self.fingerprint if fingerprint is None else fingerprint}
+        self._tree.add(value, path)
+
+    def match(self, path, value, max_distance):
+        """Return ``(original_path, entry)`` for the closest earlier image, or claim ``value`` for ``path``."""
+        with self._lock:
+            own = self._entries.get(path)
+            if own is not None and own['hash'] == value and own['fingerprint'] == self.fingerprint:
+                # Same file again: it stays the original for its copies
+                return None
+            matches = []
+            for distance, node_hash, other in self._tree.search(value, max_distance):
+                entry = self._entries.get(other)
+                # Skip the image itself, stale hashes of files that changed, originals that errored
+                # and results produced under other settings
+                if (other == path or entry is None or entry['hash'] != node_hash or entry['outcome'] == 'error'
+                        or entry['fingerprint'] != self.fingerprint):
+                    continue
+                matches.append((distance, other, entry))
+            if matches:
+                _, other, entry = min(matches, key=lambda match: match[0])
+                return other, dict(entry)
+            self._add(path, value)
+            return None
+
+    def wait(self, path, should_continue=lambda: True, poll=0.5):
+        """Block until ``path`` has an outcome; returns its entry, or None if waiting was called off."""
+        with self._finished:
+            while should_continue():
+                entry = self._entries.get(path)
+                if entry is None:
+                    return None
+                if entry['outcome'] is not None:
+                    return dict(entry)
+                self._finished.wait(poll)
+            return None
+
+    def finish(self, path, outcome, reason="", ai_response="", was_cropped=False):
+        with self._finished:
+            entry = self._entries.get(path)
+            if entry is None:
+                return
+            entry.update(outcome=outcome, reason=reason, ai_response=ai_response, was_cropped=was_cropped)
+            self._finished.notify_all()
+            if outcome == 'error':
+                # Copies are matched against it no longer and get processed themselves
+                self._conn.execute("DELETE FROM hashes WHERE path = ?", (path,))
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (path, f"{entry['hash']:016x}", outcome, reason, ai_response, int(was_cropped),
+                                    entry['fingerprint']))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
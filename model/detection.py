@@ -0,0 +1,273 @@
+import os
+import time
+import cv2
+from .image_probe import probe_size
+
+HAAR_FRONTALFACE = 'haarcascade_frontalface_default.xml'
+HAAR_FRONTALFACE_ALT2 = 'haarcascade_frontalface_alt2.xml'
+LBP_FRONTALFACE = ('lbpcascade_frontalface_improved.xml', 'lbpcascade_frontalface.xml')
+
+# DCT-domain downscaling for JPEG; other formats are decoded and resized by OpenCV
+REDUCED_GRAYSCALE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+}
+
+
+def _cascade_dirs():
+    data_dir = os.path.normpath(cv2.data.haarcascades)
+    return [
+        data_dir,
+        os.path.join(data_dir, 'lbpcascades'),
+        os.path.join(os.path.dirname(data_dir), 'lbpcascades'),
+        '/usr/share/opencv4/lbpcascades',
+        '/usr/local/share/opencv4/lbpcascades',
+        '/usr/share/opencv/lbpcascades'
+    ]
+
+
+def find_cascade(file_names):
+    if isinstance(file_names, str):
+        file_names = (file_names,)
+    for directory in _cascade_dirs():
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+class CascadeDetector:
+    def __init__(self, file_names, scale_factor=1.1, min_neighbors=5):
+        path = find_cascade(file_names)
+        if path is None:
+            raise FileNotFoundError(f"Cascade {file_names} not found next to cv2.data")
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise ValueError(f"Failed to load cascade {path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, gray, min_size=30):
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(min_size, min_size))
+        return [tuple(int(v) for v in face) for face in faces]
+
+    def detect_batch(self, images, min_sizes):
+        return [self.detect(gray, min_size) for gray, min_size in zip(images, min_sizes)]
+
+
+class EnsembleDetector:
+    """Tries each detector in turn and stops at the first one that finds a face."""
+
+    def __init__(self, detectors):
+        self.detectors = detectors
+
+    def detect(self, gray, min_size=30):
+        return self.detect_batch([gray], [min_size])[0]
+
+    def detect_batch(self, images, min_sizes):
+        results = [[] for _ in images]
+        remaining = list(range(len(images)))
+        for detector in self.detectors:
+            if not remaining:
+                break
+            found = detector.detect_batch([images[i] for i in remaining], [min_sizes[i] for i in remaining])
+            for i, faces in zip(remaining, found):
+                results[i] = faces
+            remaining = [i for i, faces in zip(remaining, found) if not faces]
+        return results
+
+
+def _ensemble():
+    members = [name for name in ('lbp', 'haar_alt2', 'haar') if name in available_backends(ensemble=False)]
+    return EnsembleDetector([DETECTOR_BACKENDS[name]() for name in members])
+
+
+DETECTOR_BACKENDS = {
+    'haar': lambda: CascadeDetector(HAAR_FRONTALFACE),
+    'haar_alt2': lambda: CascadeDetector(HAAR_FRONTALFACE_ALT2),
+    'lbp': lambda: CascadeDetector(LBP_FRONTALFACE),
+    'ensemble': _ensemble
+}
+
+_BACKEND_FILES = {
+    'haar': HAAR_FRONTALFACE,
+    'haar_alt2': HAAR_FRONTALFACE_ALT2,
+    'lbp': LBP_FRONTALFACE
+}
+
+
+def available_backends(ensemble=True):
+    # Some OpenCV builds (e.g. the pip wheels) ship without the LBP cascades
+    names = [name for name, files in _BACKEND_FILES.items() if find_cascade(files)]
+    if ensemble and names:
+        names.append('ensemble')
+    return names
+
+
+def create_detector(backend='haar'):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}")
+    return DETECTOR_BACKENDS[backend]()
+
+
+_detector = None
+
+
+def init_worker(backend='haar'):
+    # Loaded once per detection worker instead of once per image
+    global _detector
+    _detector = create_detector(backend)
+
+
+def load_detection_image(image_path, detection_scale=1, detection_max_edge=0):
+    """Decode a grayscale image for detection.
+
+    Returns ``(gray, scale, full_size)`` where ``scale`` maps detection
+    coordinates back to the original image and ``full_size`` is the
+    original ``(width, height)``, or None when it can only be bounded
+    because the decoder downscaled the image.
+    """
+    if detection_scale in REDUCED_GRAYSCALE_FLAGS:
+        gray = cv2.imread(image_path, REDUCED_GRAYSCALE_FLAGS[detection_scale])
+        scale = float(detection_scale)
+        full_size = None
+    else:
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        scale = 1.0
+        full_size = (gray.shape[1], gray.shape[0]) if gray is not None else None
+    if gray is None:
+        return None, scale, None
+
+    long_edge = max(gray.shape[:2])
+    if detection_max_edge and long_edge > detection_max_edge:
+        factor = detection_max_edge / long_edge
+        gray = cv2.resize(gray, (max(1, round(gray.shape[1] * factor)), max(1, round(gray.shape[0] * factor))),
+                          interpolation=cv2.INTER_AREA)
+        scale /= factor
+    return gray, scale, full_size
+
+
+# Stands in for a probed size when the job did not bring one; never crosses a process boundary
+_UNPROBED = object()
+
+
+def _is_small(width, height, min_width, min_height):
+    return width < min_width or height < min_height
+
+
+def _unreadable():
+    return {'final': True, 'outcome': 'error', 'reason': "Unreadable image"}
+
+
+def _small_image():
+    return {'final': True, 'outcome': 'small_image', 'reason': "Small image"}
+
+
+def _prepare(image_path, min_width, min_height, crop_faces, detection_scale=1, detection_max_edge=0,
+             probed_size=_UNPROBED):
+    # Returns either a finished record or the state needed to run the detector. The engine passes the
+    # header size it already read for the memory budget (None if unreadable), so the header is read once.
+    if probed_size is _UNPROBED:
+        probed_size = probe_size(image_path) if min_width or min_height or detection_scale != 1 else None
+    if probed_size is not None and _is_small(*probed_size, min_width, min_height):
+        # Rejected from the header alone, without decoding any pixels
+        return _small_image()
+
+    if detection_scale == 1 and not detection_max_edge:
+        image = cv2.imread(image_path)
+        if image is None:
+            return _unreadable()
+        height, width = image.shape[:2]
+        if _is_small(width, height, min_width, min_height):
+            return _small_image()
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return {'gray': gray, 'image': image, 'min_size': 30}
+
+    image = None
+    gray, scale, full_size = load_detection_image(image_path, detection_scale, detection_max_edge)
+    if gray is None:
+        return _unreadable()
+
+    if full_size is None:
+        full_size = probed_size
+    if full_size is None:
+        # A reduced decode rounds the size up, so the original lies in ((n - 1) * s, n * s]
+        factor = int(detection_scale)
+        upper = (gray.shape[1] * factor, gray.shape[0] * factor)
+        lower = ((gray.shape[1] - 1) * factor + 1, (gray.shape[0] - 1) * factor + 1)
+        if _is_small(*upper, min_width, min_height):
+            return _small_image()
+        if _is_small(*lower, min_width, min_height):
+            # Too close to the limit to decide from the reduced image
+            image = cv2.imread(image_path)
+            if image is None:
+                return _unreadable()
+            full_size = (image.shape[1], image.shape[0])
+    if full_size is not None and _is_small(*full_size, min_width, min_height):
+        return _small_image()
+
+    return {'gray': gray, 'image': image, 'min_size': max(24, round(30 / scale))}
+
+
+def _face_record(image_path, state, faces, crop_faces):
+    if not faces:
+        return {'final': True, 'outcome': 'no_face', 'reason': "No face detected"}
+
+    # Reduced-resolution detection only decodes images with a face at full resolution
+    image = state['image']
+    if image is None:
+        image = cv2.imread(image_path)
+        if image is None:
+            return _unreadable()
+    height, width = image.shape[:2]
+    gray = state['gray']
+    scale_x = width / gray.shape[1]
+    scale_y = height / gray.shape[0]
+    (x, y, w, h) = faces[0]
+    if not crop_faces:
+        return {'outcome': 'face', 'image': image, 'was_cropped': False}
+
+    x0, y0 = max(0, int(x * scale_x)), max(0, int(y * scale_y))
+    x1, y1 = min(width, int(round((x + w) * scale_x))), min(height, int(round((y + h) * scale_y)))
+    return {'outcome': 'face', 'image': image[y0:y1, x0:x1].copy(), 'was_cropped': True}
+
+
+def detect_faces(jobs):
+    """Run detection for a batch of ``(image_path, min_width, min_height, crop_faces, ...)`` jobs.
+
+    Jobs may end with the ``(width, height)`` already read from the file
+    header, or None when it could not be read.
+
+    Each record carries ``timings`` in seconds: 'decode', and for images
+    that reach the detector 'detect' (the batch time split evenly) and
+    'crop', which includes any full-resolution decode.
+    """
+    if _detector is None:
+        init_worker()
+
+    states = []
+    timings = []
+    for job in jobs:
+        started = time.perf_counter()
+        states.append(_prepare(*job))
+        timings.append({'decode': time.perf_counter() - started})
+    pending = [i for i, state in enumerate(states) if 'gray' in state]
+    started = time.perf_counter()
+    found = _detector.detect_batch([states[i]['gray'] for i in pending], [states[i]['min_size'] for i in pending])
+    detect_time = (time.perf_counter() - started) / max(len(pending), 1)
+
+    records = list(states)
+    for i, faces in zip(pending, found):
+        started = time.perf_counter()
+        records[i] = _face_record(jobs[i][0], states[i], faces, jobs[i][3])
+        timings[i].update(detect=detect_time, crop=time.perf_counter() - started)
+    for record, timing in zip(records, timings):
+        record['timings'] = timing
+    return records
+
+
+def detect_face(image_path, min_width, min_height, crop_faces, detection_scale=1, detection_max_edge=0):
+    return detect_faces([(image_path, min_width, min_height, crop_faces, detection_scale, detection_max_edge)])[0]
@@ -0,0 +1,955 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+import cv2
+import numpy as np
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from .ai_cache import ResponseCache, make_cache_key
+from .ollama_client import LoadBalancedClient
+from .payload import encode_payload, resize_to_max_edge
+from .output_writer import atomic_write, encode_output, output_name
+from .shards import ShardWriter, sample_key
+from .metrics import RunMetrics, ThreadProfiler
+from .memory_budget import MemoryBudget, estimate_decoded_bytes, peak_rss_mb
+from .image_probe import probe_size
+from .options import DEFAULT_IMAGE_EXTENSIONS
+from .manifest import RunManifest, settings_fingerprint
+from .dedup import DuplicateIndex, image_dhash
+from .detection import detect_faces, init_worker
+from .scanner import BackgroundCounter, DirectoryCountCache, scan_images
+from .watcher import FolderWatcher
+from .pipeline import Stage, StagedPipeline
+
+VALIDATION_PROMPT = "Does this image contain a human face? Answer with only 'yes' or 'no'."
+VALIDATION_TOKENS = 8
+PREVIEW_SIZE = 150
+# Returned in place of an empty answer; never cached
+NO_RESPONSE = 'No response generated'
+# Reduced-resolution decode used to detect faces in images larger than the memory budget
+OVERSIZE_DETECTION_SCALE = 8
+COMBINED_PROMPT = "Does this image contain a human face? Answer in 'face' as true or false."
+COMBINED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "face": {"type": "boolean"},
+        "tags": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["face", "tags"]
+}
+
+
+def parse_verdict(text):
+    # True/False once a complete leading yes/no word has arrived, None before that
+    match = re.match(r"\W*(yes|no)(?=\W)", text, re.IGNORECASE)
+    if match is None:
+        return None
+    return match.group(1).lower() == 'yes'
+
+
+BATCH_VALIDATION_PROMPT = ("You are given {count} images, numbered 0 to {last} in the order they are attached. "
+                           "For each image, say whether it contains a human face. Answer in 'verdicts' with one "
+                           "entry per image, giving its 'index' and 'face' as true or false.")
+BATCH_VALIDATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdicts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, "face": {"type": "boolean"}},
+                "required": ["index", "face"]
+            }
+        }
+    },
+    "required": ["verdicts"]
+}
+
+
+def parse_batch_verdicts(text, count):
+    # One boolean per image in index order, or None unless every index is answered exactly once
+    try:
+        entries = json.loads(text)['verdicts']
+        verdicts = {}
+        for entry in entries:
+            index, face = entry['index'], entry['face']
+            if not isinstance(face, bool) or not isinstance(index, int) or index in verdicts:
+                return None
+            verdicts[index] = face
+    except (ValueError, KeyError, TypeError):
+        return None
+    if sorted(verdicts) != list(range(count)):
+        return None
+    return [verdicts[i] for i in range(count)]
+
+
+def parse_combined(text):
+    # (face, caption) from the combined request's JSON answer, or None when it is unusable
+    try:
+        result = json.loads(text)
+        face, tags = result['face'], result['tags']
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(face, bool):
+        return None
+    if isinstance(tags, str):
+        tags = [tags]
+    if not isinstance(tags, list):
+        return None
+    return face, ", ".join(str(tag).strip() for tag in tags if str(tag).strip())
+
+
+class ProcessingEngine:
+    """Qt-free processing engine.
+
+    Progress is reported through the optional ``on_*`` callbacks, which
+    mirror the ImageProcessor signals, or pulled with ``results()``.
+    """
+
+    def __init__(self):
+        self.on_progress = None
+        self.on_status = None
+        self.on_image_processed = None
+        self.on_finished = None
+        self.on_current_image = None
+        self.on_caption_token = None
+        # Called with the input path as it enters the pipeline; used for latency measurements
+        self.on_image_started = None
+        self.on_metrics = None
+        self.folders = []
+        self.output_dir = ""
+        self.min_width = 0
+        self.min_height = 0
+        self.generate_captions = False
+        self.caption_limit = None
+        self.ai_validation = False
+        self.crop_faces = False
+        self.allowed_file_types = list(DEFAULT_IMAGE_EXTENSIONS)
+        self.recursive = False
+        self.dedup_mode = 'off'
+        self.dedup_max_distance = 4
+        self._dedup_index = None
+        self.watch = False
+        self.watch_debounce = 2.0
+        self.watch_poll_interval = 1.0
+        self._count_cache = DirectoryCountCache(self.allowed_file_types)
+        self._is_running = False
+        self.api_params = {
+            'url': 'http://localhost:11434',
+            'generate_uri': '/api/generate',
+            'model': 'default',
+            'prompt': "Return tags describing this picture. Use single words or short phrases separated by commas.",
+            'temperature': '0.7',
+            'max_tokens': '1000',
+            'top_p': '1',
+            'frequency_penalty': '0',
+            'presence_penalty': '0',
+            'timeout': '120',
+            'max_retries': '3',
+            'max_in_flight': '4',
+            'endpoints': []
+        }
+        self.model = None
+        self._client = None
+        self._client_config = None
+        self._client_lock = threading.Lock()
+        self.detect_workers = os.cpu_count() or 1
+        self.ai_workers = 4
+        self.write_workers = 2
+        self.cache_enabled = True
+        self.cache_path = None
+        self.cache_max_size_mb = 256
+        self.cache_max_age_days = 30
+        self.cache = None
+        self._cache_hits = 0
+        self._stats_lock = threading.Lock()
+        self.resume = False
+        self.detection_scale = 1
+        self.detection_max_edge = 0
+        self.detector_backend = 'haar'
+        self.detect_batch_size = 4
+        self.payload_max_edge = 1024
+        self.payload_format = 'jpeg'
+        self.payload_quality = 90
+        self._bytes_sent = 0
+        self.combined_request = False
+        self._combined_fallbacks = 0
+        self.validation_batch_size = 1
+        self._batch_splits = 0
+        self._ai_requests = 0
+        self._ai_images = 0
+        self.output_format = 'source'
+        self.output_quality = 95
+        self.png_compression = 1
+        self._images_written = 0
+        self._output_bytes = 0
+        self._encode_time = 0.0
+        self.export_mode = 'files'
+        self.shard_max_mb = 1024
+        self._shards = None
+        self.metrics = RunMetrics()
+        self.metrics_interval = 1.0
+        self.run_report = True
+        self.prometheus_path = None
+        self.profile_path = None
+        self.memory_budget_mb = 2048
+        self._memory = MemoryBudget()
+        self.preview_interval = 0.1
+        self._last_preview = 0.0
+
+    def set_parameters(self, folders, output_dir, min_width, min_height, generate_captions,
+                       caption_limit, ai_validation, crop_faces):
+        self.folders = folders
+        self.output_dir = output_dir
+        self.min_width = min_width
+        self.min_height = min_height
+        self.generate_captions = generate_captions
+        self.caption_limit = caption_limit
+        self.ai_validation = ai_validation
+        self.crop_faces = crop_faces
+
+    def set_api_params(self, api_params):
+        # Accept the nested layout produced by AISettingsTab.get_settings()
+        api_params = dict(api_params)
+        api_params.update(api_params.pop('api_params', {}))
+        self.api_params.update(api_params)
+
+    def set_model(self, model):
+        self.model = model
+
+    def is_running(self):
+        return self._is_running
+
+    def stop(self):
+        self._is_running = False
+
+    def set_pipeline_params(self, detect_workers=None, ai_workers=None, write_workers=None):
+        if detect_workers is not None:
+            self.detect_workers = detect_workers
+        if ai_workers is not None:
+            self.ai_workers = ai_workers
+        if write_workers is not None:
+            self.write_workers = write_workers
+
+    def set_cache_params(self, enabled=True, path=None, max_size_mb=256, max_age_days=30):
+        self.cache_enabled = enabled
+        self.cache_path = path
+        self.cache_max_size_mb = max_size_mb
+        self.cache_max_age_days = max_age_days
+
+    def set_detection_params(self, detection_scale=1, detection_max_edge=0, detector_backend='haar',
+                             detect_batch_size=4):
+        self.detection_scale = detection_scale
+        self.detection_max_edge = detection_max_edge
+        self.detector_backend = detector_backend
+        self.detect_batch_size = detect_batch_size
+
+    def set_payload_params(self, max_edge=1024, image_format='jpeg', quality=90):
+        self.payload_max_edge = max_edge
+        self.payload_format = image_format
+        self.payload_quality = quality
+
+    def encode_payload(self, image):
+        with self.metrics.time('payload_encode'):
+            return encode_payload(image, self.payload_max_edge, self.payload_format, self.payload_quality)
+
+    def set_output_params(self, image_format='source', quality=95, png_compression=1):
+        """Output encoding: 'source' keeps each input's format, or 'jpeg', 'webp' or 'png' for all."""
+        self.output_format = image_format
+        self.output_quality = quality
+        self.png_compression = png_compression
+
+    def set_export_params(self, mode='files', shard_max_mb=1024):
+        """Write loose files ('files') or WebDataset-style tar shards under output_dir/shards ('shards')."""
+        self.export_mode = mode
+        self.shard_max_mb = shard_max_mb
+
+    def set_metrics_params(self, prometheus_path=None, profile_path=None, interval=1.0, run_report=True):
+        """Where to export run metrics besides ``on_metrics``: a Prometheus textfile, a cProfile dump,
+        and ``run_report.json`` in the output directory."""
+        self.prometheus_path = prometheus_path or None
+        self.profile_path = profile_path or None
+        self.metrics_interval = interval
+        self.run_report = run_report
+
+    def set_memory_params(self, budget_mb=2048):
+        """Cap the estimated decoded pixels in flight at ``budget_mb``; 0 admits every image at once.
+
+        Images larger than the whole budget run alone, with faces detected on
+        a 1/8-scale decode.
+        """
+        self.memory_budget_mb = budget_mb
+
+    def output_name(self, image_file):
+        # Name of the exported image for an input file
+        return output_name(image_file, self.output_format)
+
+    def relative_name(self, image_path):
+        # Outputs mirror the input's subfolders, so same-named files found by a recursive scan stay apart
+        for folder in self.folders:
+            try:
+                relative = os.path.relpath(image_path, folder)
+            except ValueError:
+                # Another drive on Windows
+                continue
+            if not relative.startswith(os.pardir + os.sep):
+                return relative
+        return os.path.basename(image_path)
+
+    def set_request_params(self, combined_request=False, validation_batch_size=1):
+        self.combined_request = combined_request
+        self.validation_batch_size = validation_batch_size
+
+    def set_scan_params(self, recursive=False):
+        self.recursive = recursive
+
+    def set_dedup_params(self, mode='off', max_distance=4):
+        """Skip near-duplicate inputs ('skip') or give them the earlier copy's result ('reuse')."""
+        self.dedup_mode = mode
+        self.dedup_max_distance = max_distance
+
+    def set_watch_params(self, watch=False, debounce=2.0, poll_interval=1.0):
+        """Keep running after the initial pass and process images as they appear, until stopped."""
+        self.watch = watch
+        self.watch_debounce = debounce
+        self.watch_poll_interval = poll_interval
+
+    def set_resume(self, resume):
+        self.resume = resume
+
+    _connection_params = ('url', 'endpoints', 'timeout', 'max_retries', 'max_in_flight')
+
+    def settings_fingerprint(self):
+        # Everything that changes what ends up in output_dir for a given input
+        return settings_fingerprint({
+            'min_width': self.min_width,
+            'min_height': self.min_height,
+            'generate_captions': self.generate_captions,
+            'caption_limit': self.caption_limit,
+            'ai_validation': self.ai_validation,
+            'crop_faces': self.crop_faces,
+            'detection_scale': self.detection_scale,
+            'detection_max_edge': self.detection_max_edge,
+            'detector_backend': self.detector_backend,
+            'payload': (self.payload_max_edge, self.payload_format, self.payload_quality),
+            'output': (self.output_format, self.output_quality, self.png_compression),
+            'export_mode': self.export_mode,
+            'combined_request': self.combined_request,
+            'validation_batch_size': self.validation_batch_size,
+            'dedup': (self.dedup_mode, self.dedup_max_distance),
+            'model': self.model or self.api_params['model'],
+            'api_params': {k: v for k, v in self.api_params.items() if k not in self._connection_params}
+        })
+
+    def _notify(self, callback, *args):
+        if callback is not None:
+            callback(*args)
+
+    def results(self):
+        events = queue.Queue()
+        done = object()
+        on_image_processed, on_finished = self.on_image_processed, self.on_finished
+
+        def image_processed(*result):
+            self._notify(on_image_processed, *result)
+            events.put(result)
+
+        def finished(stats):
+            self._notify(on_finished, stats)
+            events.put(done)
+
+        self.on_image_processed, self.on_finished = image_processed, finished
+        worker = threading.Thread(target=self.run, daemon=True)
+        worker.start()
+        try:
+            while True:
+                event = events.get()
+                if event is done:
+                    break
+                yield event
+        finally:
+            self.stop()
+            worker.join()
+            self.on_image_processed, self.on_finished = on_image_processed, on_finished
+
+    def run(self):
+        self._is_running = True
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = RunManifest(self.output_dir)
+        fingerprint = self.settings_fingerprint()
+        self._dedup_index = DuplicateIndex(self.output_dir, fingerprint) if self.dedup_mode != 'off' else None
+        self.metrics = RunMetrics()
+        self._memory = memory = MemoryBudget(self.memory_budget_mb * 1024 * 1024)
+        profiler = ThreadProfiler() if self.profile_path else None
+        if self.export_mode == 'shards':
+            self._shards = ShardWriter(os.path.join(self.output_dir, 'shards'), self.shard_max_mb * 1024 * 1024)
+        # Processing starts on the first file found; the total is counted alongside for the progress bar
+        exclude = (self.output_dir,)
+        counter = BackgroundCounter(self._count_cache, self.folders, self.recursive, exclude).start()
+        file_stats = {}
+        started_at = {}
+        found_files = 0
+        skipped = 0
+        oversized = 0
+        processed_files = 0
+        stats = {
+            'total_images': 0,
+            'faces_found': 0,
+            'no_faces': 0,
+            'small_images': 0,
+            'failed_validation': 0,
+            'processed_successfully': 0,
+            'errors': 0,
+            'cache_hits': 0,
+            'skipped_resumed': 0,
+            'duplicates': 0,
+            'duplicates_reused': 0,
+            'ai_bytes_sent': 0,
+            'ai_bytes_per_image': 0,
+            'combined_fallbacks': 0,
+            'batch_splits': 0,
+            'ai_requests': 0,
+            'ai_requests_per_image': 0,
+            'ai_images': 0,
+            'output_bytes': 0,
+            'output_bytes_per_image': 0,
+            'encode_ms_per_image': 0,
+            'shards_written': 0,
+            'peak_decoded_mb': 0,
+            'memory_waits': 0,
+            'oversized_images': 0,
+            'peak_rss_mb': None,
+            'peak_rss_children_mb': None
+        }
+        self._cache_hits = 0
+        self._bytes_sent = 0
+        self._combined_fallbacks = 0
+        self._batch_splits = 0
+        self._ai_requests = 0
+        self._ai_images = 0
+        self._images_written = 0
+        self._output_bytes = 0
+        self._encode_time = 0.0
+        if self.cache_enabled and (self.ai_validation or self.generate_captions):
+            self.cache = ResponseCache(self.cache_path, self.cache_max_size_mb, self.cache_max_age_days)
+
+        def report_progress():
+            done_files = processed_files + skipped
+            self._notify(self.on_progress, min(100, int(done_files / max(counter.estimate(found_files), 1) * 100)))
+
+        watcher = None
+        if self.watch:
+            watcher = FolderWatcher(self.folders, self.allowed_file_types, self.recursive, exclude,
+                                    self.watch_debounce, self.watch_poll_interval)
+
+        def sources():
+            if watcher is None:
+                yield from scan_images(self.folders, self.allowed_file_types, self.recursive, exclude)
+                return
+            yield from watcher.scan()
+            watching = f"Watching {len(self.folders)} folder(s) for new images ({watcher.mode})..."
+            self._notify(self.on_status, watching)
+            idle = True
+            for entry in watcher.changes(self.is_running):
+                if entry is None and not idle:
+                    self._notify(self.on_status, watching)
+                idle = entry is None
+                yield entry
+
+        def jobs():
+            nonlocal found_files, skipped, oversized
+            for entry in sources():
+                if entry is None:
+                    yield None
+                    continue
+                image_path, stat = entry
+                found_files += 1
+                file_stats[image_path] = (stat.st_mtime, stat.st_size)
+                if self.resume and manifest.is_finished(image_path, stat.st_mtime, stat.st_size, fingerprint):
+                    skipped += 1
+                    continue
+                detection_scale = self.detection_scale
+                # Read once here; detection gets the size too instead of reading the header again
+                size = probe_size(image_path)
+                estimate = estimate_decoded_bytes(size, stat.st_size, detection_scale)
+                if memory.is_oversized(estimate):
+                    oversized += 1
+                    if detection_scale < OVERSIZE_DETECTION_SCALE:
+                        detection_scale = OVERSIZE_DETECTION_SCALE
+                        estimate = estimate_decoded_bytes(size, stat.st_size, detection_scale)
+                # Waits here while the budget is full, which holds back every stage behind the source
+                if not memory.acquire(image_path, estimate, self.is_running):
+                    break
+                self._notify(self.on_status, f"Processing {self.relative_name(image_path)}...")
+                self._notify(self.on_image_started, image_path)
+                self.metrics.add_bytes('input', stat.st_size)
+                started_at[image_path] = time.perf_counter()
+                yield image_path, (image_path, self.min_width, self.min_height, self.crop_faces,
+                                   detection_scale, self.detection_max_edge, size)
+
+        def on_detected(image_path, record):
+            # A face counts once detection finds it, whatever happens to it in the AI step
+            if record['outcome'] == 'face':
+                with self._stats_lock:
+                    stats['faces_found'] += 1
+            # Only the exported image (the crop, or the full image) stays in memory after detection
+            image = record.get('image')
+            memory.shrink(image_path, image.nbytes if image is not None else 0)
+
+        def on_result(image_path, record):
+            nonlocal processed_files
+            image_file = self.relative_name(image_path) if image_path else ""
+            outcome = record['outcome']
+            for name, seconds in record.pop('timings', {}).items():
+                self.metrics.observe(name, seconds)
+            if image_path in started_at:
+                self.metrics.observe('total', time.perf_counter() - started_at.pop(image_path))
+            self.metrics.count_outcome(outcome)
+            stats[self._outcome_stats[outcome]] += 1
+            if record.get('duplicate_of') and outcome != 'duplicate':
+                stats['duplicates_reused'] += 1
+                # Reused results skip detection; the original had a face if it got past it
+                if outcome in ('failed_validation', 'processed'):
+                    with self._stats_lock:
+                        stats['faces_found'] += 1
+            if image_path:
+                memory.release(image_path)
+                manifest.record(image_path, *file_stats[image_path], fingerprint, outcome)
+                if self._dedup_index is not None and not record.get('duplicate_of'):
+                    self._dedup_index.finish(image_path, outcome, record['reason'], record.get('ai_response', ""),
+                                             record.get('was_cropped', False))
+            self._notify(self.on_image_processed, image_file, outcome == 'processed', record['reason'],
+                         record.get('was_cropped', False), record.get('ai_response', ""))
+            processed_files += 1
+            report_progress()
+
+        def stage(fn, workers, name, **kwargs):
+            # Under the profiler every stage thread records into its own profile (one shared profile from 3.12)
+            return Stage(profiler.wrap(fn) if profiler else fn, workers, name=name, **kwargs)
+
+        stages = [stage(self._ai_stage, self.ai_workers, 'ai'), stage(self._write_stage, self.write_workers, 'write')]
+        if self._batched_validation():
+            stages.insert(0, stage(self._validate_batch_stage, self.ai_workers, 'validate_batch',
+                                   batch_size=self.validation_batch_size))
+        pipeline = StagedPipeline(detect_faces, stages, detect_workers=self.detect_workers,
+                                  detect_initializer=init_worker, detect_initargs=(self.detector_backend,),
+                                  detect_batch_size=self.detect_batch_size,
+                                  prefilter=stage(self._dedup_stage, self.ai_workers, 'dedup') if self._dedup_index is not None else None,
+                                  on_detected=on_detected)
+
+        def publish_metrics():
+            self.metrics.sample_queues(pipeline.queue_depths())
+            self.metrics.set_gauge('decoded_bytes_in_flight', memory.in_flight)
+            self.metrics.set_gauge('decoded_bytes_peak', memory.peak)
+            self._notify(self.on_metrics, self.metrics.snapshot())
+            if self.prometheus_path:
+                try:
+                    self.metrics.write_prometheus(self.prometheus_path)
+                except OSError:
+                    pass
+
+        sampling_done = threading.Event()
+
+        def sample_metrics():
+            while not sampling_done.wait(self.metrics_interval):
+                publish_metrics()
+
+        sampler = threading.Thread(target=sample_metrics, daemon=True)
+        sampler.start()
+        if profiler is not None:
+            profiler.start()
+        try:
+            pipeline.run(jobs(), profiler.wrap(on_result) if profiler else on_result, self.is_running)
+        finally:
+            sampling_done.set()
+            sampler.join()
+            self.metrics.finish()
+            publish_metrics()
+            if profiler is not None:
+                profiler.stop()
+                profiler.dump(self.profile_path)
+            if watcher is not None:
+                watcher.close()
+            manifest.close()
+            if self._dedup_index is not None:
+                self._dedup_index.close()
+                self._dedup_index = None
+            if self.cache is not None:
+                self.cache.close()
+                self.cache = None
+            if self._shards is not None:
+                stats['shards_written'] = self._shards.shards_written
+                self._shards.close()
+                self._shards = None
+        stats['total_images'] = found_files
+        stats['skipped_resumed'] = skipped
+        if self.is_running():
+            report_progress()
+        stats['cache_hits'] = self._cache_hits
+        stats['ai_bytes_sent'] = self._bytes_sent
+        stats['combined_fallbacks'] = self._combined_fallbacks
+        stats['batch_splits'] = self._batch_splits
+        stats['endpoints'] = self.endpoint_stats()
+        stats['ai_requests'] = self._ai_requests
+        # Per image that reached the AI step, including those whose requests failed
+        stats['ai_images'] = self._ai_images
+        if self._ai_images:
+            stats['ai_bytes_per_image'] = self._bytes_sent // self._ai_images
+            stats['ai_requests_per_image'] = round(self._ai_requests / self._ai_images, 2)
+        stats['output_bytes'] = self._output_bytes
+        if self._images_written:
+            stats['output_bytes_per_image'] = self._output_bytes // self._images_written
+            stats['encode_ms_per_image'] = round(self._encode_time / self._images_written * 1000, 2)
+        memory_stats = memory.stats()
+        stats['peak_decoded_mb'] = memory_stats['peak_mb']
+        stats['memory_waits'] = memory_stats['waits']
+        stats['oversized_images'] = oversized
+        stats['peak_rss_mb'] = peak_rss_mb()
+        # Detection processes count once they have exited, which they have by now
+        stats['peak_rss_children_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+        stats['metrics'] = self.metrics.snapshot()
+        if self.run_report:
+            report_path = os.path.join(self.output_dir, 'run_report.json')
+            try:
+                self.metrics.write_report(report_path, stats={key: value for key, value in stats.items()
+                                                              if key != 'metrics'})
+            except OSError as e:
+                # The run itself is done; losing the report must not lose its results
+                self._notify(self.on_status, f"Could not write {report_path}: {e}")
+
+        self._notify(self.on_finished, stats)
+        self._is_running = False
+
+    _outcome_stats = {
+        'small_image': 'small_images',
+        'no_face': 'no_faces',
+        'failed_validation': 'failed_validation',
+        'processed': 'processed_successfully',
+        'error': 'errors',
+        'duplicate': 'duplicates'
+    }
+
+    def _dedup_stage(self, image_path, detect_args):
+        with self.metrics.time('dedup_hash'):
+            image_hash = image_dhash(image_path)
+        if image_hash is None:
+            # Detection reports the unreadable file
+            return None
+        match = self._dedup_index.match(image_path, image_hash, self.dedup_max_distance)
+        if match is None:
+            return None
+        original_path, original = match
+        original_file = self.relative_name(original_path)
+        if original['outcome'] is None:
+            # The original is still in flight; if it fails, this copy has to be processed itself
+            original = self._dedup_index.wait(original_path, self.is_running)
+            if original is None or original['outcome'] == 'error':
+                return None
+        if self.dedup_mode == 'skip':
+            return {'final': True, 'outcome': 'duplicate', 'reason': f"Near-duplicate of {original_file}",
+                    'duplicate_of': original_path}
+        if original['outcome'] == 'processed':
+            try:
+                self._copy_outputs(original_file, image_path)
+            except (OSError, ValueError):
+                return None
+        return {'final': True, 'outcome': original['outcome'], 'duplicate_of': original_path,
+                'reason': f"{original['reason']} (reused from {original_file})",
+                'ai_response': original['ai_response'], 'was_cropped': original['was_cropped']}
+
+    def _copy_outputs(self, original_file, image_path):
+        image_file = self.relative_name(image_path)
+        if original_file == image_file:
+            return
+        if self._shards is not None:
+            members = self._shards.read(sample_key(original_file))
+            if members is None:
+                raise OSError(f"{original_file} is not in the shard index")
+            if 'json' in members:
+                metadata = dict(json.loads(members['json']), source=image_path)
+                members['json'] = json.dumps(metadata).encode('utf-8')
+            self._shards.add(sample_key(image_file), members)
+            return
+        original_output = self.output_name(original_file)
+        output_file = self.output_name(image_file)
+        with open(os.path.join(self.output_dir, original_output), 'rb') as original:
+            data = original.read()
+        extension = os.path.splitext(output_file)[1].lower()
+        if extension.replace('.jpeg', '.jpg') != os.path.splitext(original_output)[1].lower().replace('.jpeg', '.jpg'):
+            # 'Same as input' output keeps each original's format, so a copy named for another format is re-encoded
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"Could not decode {original_output}")
+            data = encode_output(image, extension, self.output_quality, self.png_compression)
+        self._write_output(output_file, data)
+        original_caption = os.path.join(self.output_dir, "captions", f"{os.path.splitext(original_file)[0]}.txt")
+        if os.path.exists(original_caption):
+            with open(original_caption) as caption_file:
+                self.save_caption(image_file, caption_file.read())
+
+    def _ai_stage(self, image_path, record):
+        image = record.pop('image')
+        image_file = self.relative_name(image_path)
+        self._preview(image_path, image)
+        ai_response = ""
+        caption = None
+        # One downscaled encode shared by validation and captioning
+        payload = record.pop('payload', None)
+        if payload is None and (self.ai_validation or self.generate_captions):
+            # Images from the batched validation stage were counted there
+            with self._stats_lock:
+                self._ai_images += 1
+            payload = self.encode_payload(image)
+        on_token = lambda text: self._notify(self.on_caption_token, image_file, text)
+
+        verdict = None
+        if 'valid' in record:
+            # Already validated in a batched request
+            valid, ai_response = record.pop('valid'), record.pop('ai_response')
+            verdict = (valid, None)
+        elif self.ai_validation and self.generate_captions and self.combined_request:
+            verdict = self.validate_and_caption(payload, on_token)
+            if verdict is None:
+                with self._stats_lock:
+                    self._combined_fallbacks += 1
+            else:
+                valid, caption = verdict
+                ai_response = caption if valid else "no"
+        if verdict is None and self.ai_validation:
+            valid, ai_response = self.validate_image(image, payload)
+        if self.ai_validation and not valid:
+            record.update(final=True, outcome='failed_validation', reason="Failed AI validation",
+                          ai_response=ai_response)
+            return record
+
+        # Encoding is left to the writer threads so AI workers go straight back to requests
+        record['image'] = image
+        if self.generate_captions:
+            if caption is None:
+                caption = self.make_ai_request(payload, self.api_params['prompt'], num_predict=self.caption_limit,
+                                               on_token=on_token)
+            record['caption'] = caption
+            ai_response = caption
+        record['ai_response'] = ai_response
+        return record
+
+    def _write_stage(self, image_path, record):
+        image_file = self.relative_name(image_path)
+        output_file = self.output_name(image_file)
+        started = time.perf_counter()
+        buffer = encode_output(record.pop('image'), os.path.splitext(output_file)[1], self.output_quality,
+                               self.png_compression)
+        encode_time = time.perf_counter() - started
+        self.metrics.observe('output_encode', encode_time)
+        with self.metrics.time('write'):
+            if self._shards is not None:
+                self._write_sample(image_path, record, output_file, buffer)
+            else:
+                self._write_output(output_file, buffer)
+                if 'caption' in record:
+                    self.save_caption(image_file, record['caption'])
+        self.metrics.add_bytes('output', buffer.nbytes)
+        with self._stats_lock:
+            self._images_written += 1
+            self._output_bytes += buffer.nbytes
+            self._encode_time += encode_time
+        record.update(final=True, outcome='processed', reason="Processed successfully")
+        return record
+
+    def _write_output(self, output_file, data):
+        path = os.path.join(self.output_dir, output_file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, data)
+
+    def _write_sample(self, image_path, record, output_file, buffer):
+        # Image, caption and metadata go into the current shard as one sample
+        members = {os.path.splitext(output_file)[1][1:].lower(): buffer.tobytes()}
+        if 'caption' in record:
+            members['txt'] = record['caption'].encode('utf-8')
+        metadata = {
+            'source': image_path,
+            'cropped': record.get('was_cropped', False),
+            'ai_response': record.get('ai_response', "")
+        }
+        members['json'] = json.dumps(metadata).encode('utf-8')
+        self._shards.add(sample_key(output_file), members)
+
+    def _preview(self, image_path, image):
+        # Thumbnail from pixels detection already decoded, produced at most every preview_interval seconds
+        if self.on_current_image is None:
+            return
+        now = time.monotonic()
+        with self._stats_lock:
+            if now - self._last_preview < self.preview_interval:
+                return
+            self._last_preview = now
+        self._notify(self.on_current_image, image_path, resize_to_max_edge(image, PREVIEW_SIZE))
+
+    def _batched_validation(self):
+        # The combined request already validates in the same call as the caption
+        return (self.ai_validation and self.validation_batch_size > 1
+                and not (self.generate_captions and self.combined_request))
+
+    def _validate_batch_stage(self, image_paths, records):
+        with self._stats_lock:
+            self._ai_images += len(records)
+        for record in records:
+            record['payload'] = self.encode_payload(record['image'])
+        verdicts = self.validate_images([record['payload'] for record in records])
+        for record, (valid, response) in zip(records, verdicts):
+            if valid:
+                record.update(valid=True, ai_response=response)
+            else:
+                record.pop('image')
+                record.pop('payload')
+                record.update(final=True, outcome='failed_validation', reason="Failed AI validation",
+                              ai_response=response)
+        return records
+
+    def validate_images(self, payloads):
+        """Validate several payloads in one multi-image request.
+
+        Returns one ``(valid, response)`` per payload. When the model's answer
+        cannot be matched to every image the batch is split and retried, down
+        to single-image requests.
+        """
+        if len(payloads) == 1:
+            return [self.validate_image(None, payloads[0])]
+
+        prompt = BATCH_VALIDATION_PROMPT.format(count=len(payloads), last=len(payloads) - 1)
+        response = self.make_ai_request(payloads, prompt, num_predict=16 * len(payloads) + 16,
+                                        response_format=BATCH_VALIDATION_SCHEMA,
+                                        cache_if=lambda text: parse_batch_verdicts(text, len(payloads)) is not None)
+        verdicts = parse_batch_verdicts(response, len(payloads))
+        if verdicts is None:
+            with self._stats_lock:
+                self._batch_splits += 1
+            middle = len(payloads) // 2
+            return self.validate_images(payloads[:middle]) + self.validate_images(payloads[middle:])
+        return [(verdict, "yes" if verdict else "no") for verdict in verdicts]
+
+    def validate_and_caption(self, image_base64, on_token=None):
+        """Validate and caption with one JSON-formatted request.
+
+        Returns ``(valid, caption)``, or None when the model did not return
+        usable JSON and the caller should fall back to separate requests.
+        """
+        prompt = (f"{COMBINED_PROMPT} Also: {self.api_params['prompt']} "
+                  "Put that answer in 'tags' as a list of strings.")
+        # Leave room for the JSON wrapper around the caption budget
+        num_predict = self.caption_limit + 24 if self.caption_limit else None
+        response = self.make_ai_request(image_base64, prompt, num_predict=num_predict, on_token=on_token,
+                                        response_format=COMBINED_SCHEMA,
+                                        cache_if=lambda text: parse_combined(text) is not None)
+        return parse_combined(response)
+
+    def validate_image(self, image, image_base64=None):
+        if image_base64 is None:
+            image_base64 = self.encode_payload(image)
+        # Generation stops as soon as the leading yes/no is complete
+        response = self.make_ai_request(image_base64, VALIDATION_PROMPT, num_predict=VALIDATION_TOKENS,
+                                        stop_when=lambda text: parse_verdict(text) is not None,
+                                        cache_if=lambda text: parse_verdict(text + ' ') is not None)
+        return parse_verdict(response + ' ') is True, response
+
+    def generate_caption(self, image_path):
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Unreadable image: {image_path}")
+        image_base64 = self.encode_payload(image)
+        caption = self.make_ai_request(image_base64, self.api_params['prompt'], num_predict=self.caption_limit)
+        self.save_caption(self.relative_name(image_path), caption)
+        return caption
+
+    def save_caption(self, image_file, caption):
+        base_name = os.path.splitext(image_file)[0]
+        caption_path = os.path.join(self.output_dir, "captions", f"{base_name}.txt")
+        os.makedirs(os.path.dirname(caption_path), exist_ok=True)
+        atomic_write(caption_path, caption.encode('utf-8'))
+
+    def endpoint_urls(self):
+        urls = [self.api_params['url']] + list(self.api_params.get('endpoints', []))
+        return list(dict.fromkeys(url.strip().rstrip('/') for url in urls if url.strip()))
+
+    def get_client(self):
+        # One pooled client per connection configuration, shared by all AI workers
+        config = (tuple(self.endpoint_urls()), float(self.api_params['timeout']), int(self.api_params['max_retries']),
+                  int(self.api_params['max_in_flight']))
+        with self._client_lock:
+            if self._client is None or self._client_config != config:
+                if self._client is not None:
+                    self._client.close()
+                urls, timeout, max_retries, max_in_flight = config
+                self._client = LoadBalancedClient(urls, timeout=timeout, max_retries=max_retries,
+                                                  max_in_flight=max_in_flight)
+                self._client_config = config
+            return self._client
+
+    def endpoint_stats(self):
+        with self._client_lock:
+            return self._client.endpoint_stats() if self._client is not None else []
+
+    def generation_options(self, num_predict=None):
+        return {
+            "temperature": float(self.api_params['temperature']),
+            # Ollama's token budget; max_tokens is the default when no tighter limit applies
+            "num_predict": int(num_predict or self.api_params['max_tokens']),
+            "top_p": float(self.api_params['top_p']),
+            "frequency_penalty": float(self.api_params['frequency_penalty']),
+            "presence_penalty": float(self.api_params['presence_penalty'])
+        }
+
+    def make_ai_request(self, image_base64, prompt, num_predict=None, on_token=None, stop_when=None,
+                        response_format=None, cache_if=None):
+        """Send one generate request and return the stripped response text.
+
+        Responses are cached only when non-empty and accepted by ``cache_if``
+        (when given), so an answer the caller cannot parse is asked again on
+        the next run instead of being replayed from the cache.
+        """
+        images = image_base64 if isinstance(image_base64, list) else [image_base64]
+        payload = {
+            "model": self.model or self.api_params['model'],
+            "prompt": prompt,
+            "images": images,
+            "options": self.generation_options(num_predict)
+        }
+        if response_format is not None:
+            payload['format'] = response_format
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key("\n".join(images), payload['model'], prompt, payload['options'], response_format)
+            cached = self.cache.get(cache_key)
+            # Entries cached before unusable answers were filtered out are asked again
+            if cached is not None and cached != NO_RESPONSE and (cache_if is None or cache_if(cached)):
+                with self._stats_lock:
+                    self._cache_hits += 1
+                return cached
+
+        with self._stats_lock:
+            self._bytes_sent += sum(len(image) for image in images)
+            self._ai_requests += 1
+        self.metrics.add_bytes('ai_sent', sum(len(image) for image in images))
+        result = ""
+        stream = self.get_client().generate_stream(payload, self.api_params['generate_uri'])
+        try:
+            with self.metrics.time('ai_request'):
+                for chunk in stream:
+                    result += chunk.get('response', '')
+                    self._notify(on_token, result)
+                    if stop_when is not None and stop_when(result):
+                        break
+        finally:
+            # Stops generation on the server when we end early
+            stream.close()
+        self.metrics.add_bytes('ai_received', len(result.encode('utf-8')))
+        result = result.strip()
+        if cache_key is not None and result and (cache_if is None or cache_if(result)):
+            self.cache.put(cache_key, result)
+        return result or NO_RESPONSE
@@ -0,0 +1,26 @@
+import os
+import queue
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+from .scanner import DirectoryCountCache
+
+
+class FolderCounter(QObject):
+    """Counts folder images on a background thread so slow shares don't block the GUI."""
+
+    folder_counted = pyqtSignal(str, bool, int)  # folder, recursive, image count
+
+    def __init__(self, extensions):
+        super().__init__()
+        self.cache = DirectoryCountCache(extensions)
+        self._requests = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def request(self, folder, recursive=False):
+        self._requests.put((folder, recursive))
+
+    def _run(self):
+        while True:
+            folder, recursive = self._requests.get()
+            if os.path.isdir(folder):
+                self.folder_counted.emit(folder, recursive, self.cache.count(folder, recursive))
@@ -0,0 +1,118 @@
+import struct
+
+# JPEG start-of-frame markers that carry the image size (everything in C0-CF except DHT, JPG and DAC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# EXIF orientations that rotate by 90 degrees; OpenCV applies them when decoding
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def _exif_orientation(data):
+    """Orientation tag from an APP1 Exif payload, or None."""
+    if not data.startswith(b'Exif\0\0') or len(data) < 14:
+        return None
+    tiff = data[6:]
+    byte_order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if byte_order is None:
+        return None
+    ifd_offset = struct.unpack(byte_order + 'I', tiff[4:8])[0]
+    if ifd_offset + 2 > len(tiff):
+        return None
+    entries = struct.unpack(byte_order + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+    for i in range(entries):
+        entry = tiff[ifd_offset + 2 + 12 * i:ifd_offset + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        tag, _, _ = struct.unpack(byte_order + 'HHI', entry[:8])
+        if tag == 0x0112:
+            return struct.unpack(byte_order + 'H', entry[8:10])[0]
+    return None
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    orientation = None
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if length < 2:
+            return None
+        if marker == 0xE1 and orientation is None:
+            orientation = _exif_orientation(f.read(length - 2))
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            header = f.read(5)
+            if len(header) < 5:
+                return None
+            height, width = struct.unpack('>HH', header[1:5])
+            if orientation in _TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def _png_size(header):
+    if header[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', header[16:24])
+
+
+def _webp_size(header):
+    chunk = header[12:16]
+    if chunk == b'VP8 ' and header[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and header[20:21] == b'\x2f':
+        bits = int.from_bytes(header[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        return int.from_bytes(header[24:27], 'little') + 1, int.from_bytes(header[27:30], 'little') + 1
+    return None
+
+
+def _bmp_size(header):
+    if struct.unpack('<I', header[14:18])[0] < 40:
+        return struct.unpack('<HH', header[18:22])
+    width, height = struct.unpack('<ii', header[18:26])
+    return width, abs(height)
+
+
+def probe_size(path):
+    """Read ``(width, height)`` from the file header without decoding pixels.
+
+    Handles PNG, JPEG (honouring the EXIF orientation the decoder applies),
+    WebP, GIF and BMP. Returns None for other formats, truncated headers and
+    files that cannot be opened; callers then fall back to a full decode.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(32)
+            if len(header) < 24:
+                return None
+            if header.startswith(b'\x89PNG\r\n\x1a\n'):
+                return _png_size(header)
+            if header.startswith(b'\xff\xd8'):
+                return _jpeg_size(f)
+            if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+                return _webp_size(header)
+            if header[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', header[6:10])
+            if header.startswith(b'BM'):
+                return _bmp_size(header)
+    except (OSError, struct.error):
+        return None
+    return None
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Outcomes that do not need to be redone when resuming under the same settings
+FINISHED_OUTCOMES = ('small_image', 'no_face', 'failed_validation', 'processed', 'duplicate')
+
+
+def settings_fingerprint(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+class RunManifest:
+    """Append-only JSON lines log of every input handled in an output directory."""
+
+    FILE_NAME = 'manifest.jsonl'
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILE_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        cut_off = self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if cut_off:
+            # New entries start on a line of their own, not glued to the cut-off one
+            self._file.write('\n')
+
+    def _load(self):
+        # Returns True when the file ends in the middle of a line
+        if not os.path.exists(self.path):
+            return False
+        cut_off = False
+        with open(self.path, 'r', encoding='utf-8') as manifest:
+            for line in manifest:
+                cut_off = not line.endswith('\n')
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash can leave a truncated last line behind
+                    continue
+                self._entries[entry['path']] = entry
+        return cut_off
+
+    def is_finished(self, path, mtime, size, fingerprint):
+        entry = self._entries.get(path)
+        return (entry is not None and entry['mtime'] == mtime and entry['size'] == size
+                and entry['fingerprint'] == fingerprint and entry['outcome'] in FINISHED_OUTCOMES)
+
+    def record(self, path, mtime, size, fingerprint, outcome):
+        entry = {
+            'path': path,
+            'mtime': mtime,
+            'size': size,
+            'fingerprint': fingerprint,
+            'outcome': outcome,
+            'time': time.time()
+        }
+        with self._lock:
+            self._entries[path] = entry
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
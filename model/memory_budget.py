@@ -0,0 +1,108 @@
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Decoded bytes per pixel: the BGR image the crop is cut from, plus the grayscale copy for detection
+COLOR_BYTES = 3
+GRAY_BYTES = 1
+# Assumed decoded size per file byte when the header can't be read; about what JPEG compresses photos by
+UNKNOWN_SIZE_RATIO = 10
+
+
+def estimate_decoded_bytes(size, file_size=0, detection_scale=1):
+    """Peak decoded size of one image in the detection step, from its header ``(width, height)``.
+
+    Counts the full-resolution BGR image and the grayscale copy the
+    detector sees, which a reduced decode shrinks by ``detection_scale``
+    on each side. Without a size (an unreadable header) the estimate
+    comes from ``file_size``.
+    """
+    if size is None:
+        return file_size * UNKNOWN_SIZE_RATIO
+    pixels = size[0] * size[1]
+    return pixels * COLOR_BYTES + pixels * GRAY_BYTES // (detection_scale * detection_scale)
+
+
+def peak_rss_mb(who=None):
+    """Peak resident set size of this process (or ``resource.RUSAGE_CHILDREN``) in MB; None without ``resource``."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class MemoryBudget:
+    """Admits images into the pipeline while their estimated decoded pixels fit in ``max_bytes``.
+
+    ``acquire`` blocks until the reservation fits, which stops the job
+    source and so backs up every stage before it. A reservation larger
+    than the whole budget waits until nothing else is in flight and then
+    runs alone. ``shrink`` lowers a reservation once the full image has
+    been dropped, e.g. to the size of the crop. ``max_bytes`` of 0 or
+    None admits everything but still tracks the peak.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or None
+        self._condition = threading.Condition()
+        self._reserved = {}  # key -> bytes counted against the budget
+        self.in_flight = 0
+        self.peak = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def is_oversized(self, size):
+        return self.max_bytes is not None and size > self.max_bytes
+
+    def acquire(self, key, size, should_continue=lambda: True, poll_interval=0.1):
+        """Reserve ``size`` bytes for ``key``; returns False if ``should_continue`` turned false while waiting."""
+        started = None
+        with self._condition:
+            while self.max_bytes is not None and self.in_flight and self.in_flight + size > self.max_bytes:
+                if started is None:
+                    started = time.perf_counter()
+                    self.waits += 1
+                if not should_continue():
+                    self.wait_time += time.perf_counter() - started
+                    return False
+                self._condition.wait(poll_interval)
+            if started is not None:
+                self.wait_time += time.perf_counter() - started
+            self._reserved[key] = self._reserved.get(key, 0) + size
+            self.in_flight += size
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def shrink(self, key, size):
+        with self._condition:
+            reserved = self._reserved.get(key)
+            if reserved is None or size >= reserved:
+                return
+            self._reserved[key] = size
+            self.in_flight -= reserved - size
+            self._condition.notify_all()
+
+    def release(self, key):
+        with self._condition:
+            reserved = self._reserved.pop(key, None)
+            if reserved is None:
+                return
+            self.in_flight -= reserved
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'budget_mb': None if self.max_bytes is None else round(self.max_bytes / (1024 * 1024), 1),
+                'in_flight_mb': round(self.in_flight / (1024 * 1024), 1),
+                'peak_mb': round(self.peak / (1024 * 1024), 1),
+                'waits': self.waits,
+                'wait_s': round(self.wait_time, 3)
+            }
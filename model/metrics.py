@@ -0,0 +1,235 @@
+import bisect
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from .output_writer import atomic_write
+
+# Upper bounds in seconds; wide enough for a sub-millisecond crop and a minute-long caption request
+HISTOGRAM_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                     1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are interpolated within a bucket."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+
+class RunMetrics:
+    """Per-run timings, byte counters, outcome counts, queue depths and gauges.
+
+    ``observe`` and ``add_bytes`` are cheap enough for the per-image hot
+    path: one lock and a few integer updates. ``snapshot`` turns the current
+    state into a plain dict for the live panel and the JSON run report;
+    ``prometheus_text`` renders it in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.finished = None
+        self._histograms = {}
+        self._bytes = {}
+        self._outcomes = {}
+        self._queues = {}  # name -> [current depth, max depth]
+        self._gauges = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def add_bytes(self, name, count):
+        with self._lock:
+            self._bytes[name] = self._bytes.get(name, 0) + count
+
+    def count_outcome(self, outcome):
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+
+    def sample_queues(self, depths):
+        with self._lock:
+            for name, depth in depths.items():
+                entry = self._queues.setdefault(name, [0, 0])
+                entry[0] = depth
+                entry[1] = max(entry[1], depth)
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def finish(self):
+        with self._lock:
+            self.finished = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'elapsed_s': round((self.finished or time.time()) - self.started, 3),
+                'stages': {name: {
+                    'count': histogram.count,
+                    'total_s': round(histogram.sum, 3),
+                    'mean_ms': round(histogram.sum / histogram.count * 1000, 2) if histogram.count else 0.0,
+                    'p50_ms': round(histogram.quantile(0.5) * 1000, 2),
+                    'p95_ms': round(histogram.quantile(0.95) * 1000, 2),
+                    'max_ms': round(histogram.max * 1000, 2)
+                } for name, histogram in self._histograms.items()},
+                'bytes': dict(self._bytes),
+                'outcomes': dict(self._outcomes),
+                'queues': {name: {'depth': depth, 'max': peak} for name, (depth, peak) in self._queues.items()},
+                'gauges': dict(self._gauges)
+            }
+
+    def prometheus_text(self, prefix='portrait_export'):
+        with self._lock:
+            lines = [f"# HELP {prefix}_stage_seconds Time spent per image in each processing step.",
+                     f"# TYPE {prefix}_stage_seconds histogram"]
+            for name, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+            lines += [f"# HELP {prefix}_bytes_total Bytes read, sent to Ollama and written.",
+                      f"# TYPE {prefix}_bytes_total counter"]
+            lines += [f'{prefix}_bytes_total{{kind="{name}"}} {count}' for name, count in sorted(self._bytes.items())]
+            lines += [f"# HELP {prefix}_images_total Images finished, by outcome.",
+                      f"# TYPE {prefix}_images_total counter"]
+            lines += [f'{prefix}_images_total{{outcome="{outcome}"}} {count}'
+                      for outcome, count in sorted(self._outcomes.items())]
+            lines += [f"# HELP {prefix}_queue_depth Entries waiting in each pipeline queue.",
+                      f"# TYPE {prefix}_queue_depth gauge"]
+            lines += [f'{prefix}_queue_depth{{queue="{name}"}} {depth}'
+                      for name, (depth, _) in sorted(self._queues.items())]
+            for name, value in sorted(self._gauges.items()):
+                lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+            lines += [f"# HELP {prefix}_running Whether a run is in progress.",
+                      f"# TYPE {prefix}_running gauge",
+                      f"{prefix}_running {0 if self.finished else 1}",
+                      f"# HELP {prefix}_run_start_time_seconds Unix time the current or last run started.",
+                      f"# TYPE {prefix}_run_start_time_seconds gauge",
+                      f"{prefix}_run_start_time_seconds {self.started}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # The node exporter's textfile collector needs files to appear atomically
+        atomic_write(path, self.prometheus_text().encode('utf-8'))
+
+    def write_report(self, path, **extra):
+        report = dict(extra, metrics=self.snapshot())
+        atomic_write(path, json.dumps(report, indent=2).encode('utf-8'))
+
+
+class ThreadProfiler:
+    """cProfile across threads: ``wrap`` gives each calling thread its own profiler, merged on ``dump``.
+
+    Before Python 3.12 cProfile only follows the thread that enabled it, so
+    the pipeline's stage functions are wrapped instead of the whole run.
+    From 3.12 cProfile is built on the process-wide ``sys.monitoring`` and
+    only one profiler can be active at a time, so ``start`` enables a single
+    profiler that sees every thread and ``wrap`` leaves functions alone.
+    Work done in the detection processes is not included; its time shows up
+    in the stage histograms.
+    """
+
+    PROCESS_WIDE = sys.version_info >= (3, 12)
+
+    def __init__(self):
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._run_profile = None
+
+    def _profile(self):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def start(self):
+        if not self.PROCESS_WIDE:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler, e.g. python -m cProfile, already covers the process
+            return
+        self._run_profile = profile
+        with self._lock:
+            self._profiles.append(profile)
+
+    def stop(self):
+        if self._run_profile is not None:
+            self._run_profile.disable()
+            self._run_profile = None
+
+    def wrap(self, fn):
+        if self.PROCESS_WIDE:
+            return fn
+
+        def profiled(*args, **kwargs):
+            profile = self._profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiling tool is active; run the call unprofiled rather than fail it
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def dump(self, path):
+        with self._lock:
+            profiles = [profile for profile in self._profiles if profile.getstats()]
+        if not profiles:
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
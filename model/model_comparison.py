@@ -0,0 +1,147 @@
+import threading
+import time
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# Streamed text is handed to the GUI at most this often per target
+UPDATE_INTERVAL = 0.1
+
+
+class ModelComparison(QObject):
+    """Sends one image and prompt to several Ollama targets and times each answer.
+
+    A target is a ``(base_url, model)`` pair. ``start`` encodes the image
+    once with the production payload settings, then streams every target
+    on its own daemon thread (or one after another with ``sequential``).
+    Signals carry the target's index in the list given to ``start``; the
+    response cache and retries are bypassed so the numbers are the
+    server's own.
+    """
+
+    response_update = pyqtSignal(int, str)  # index, response text so far
+    target_finished = pyqtSignal(int, dict)  # index, measurements
+    target_failed = pyqtSignal(int, str)  # index, error message
+    comparison_failed = pyqtSignal(str)  # the image could not be prepared
+    comparison_finished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def is_running(self):
+        with self._lock:
+            return self._running
+
+    def stop(self):
+        self._cancel.set()
+
+    def start(self, image_path, prompt, targets, options, payload=None, generate_uri='/api/generate',
+              timeout=120, sequential=False):
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        self._cancel = threading.Event()
+        threading.Thread(target=self._run, daemon=True,
+                         args=(image_path, prompt, list(targets), dict(options), dict(payload or {}), generate_uri,
+                               timeout, sequential, self._cancel)).start()
+        return True
+
+    def _run(self, image_path, prompt, targets, options, payload, generate_uri, timeout, sequential, cancel):
+        try:
+            try:
+                image_base64 = self._encode(image_path, payload)
+            except Exception as e:
+                self.comparison_failed.emit(str(e))
+                return
+            jobs = [(index, url, model, {"model": model, "prompt": prompt, "images": [image_base64],
+                                         "options": options})
+                    for index, (url, model) in enumerate(targets)]
+            if sequential:
+                for job in jobs:
+                    if cancel.is_set():
+                        break
+                    self._run_target(*job, generate_uri, timeout, cancel)
+                return
+            threads = [threading.Thread(target=self._run_target, args=(*job, generate_uri, timeout, cancel),
+                                        daemon=True) for job in jobs]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            with self._lock:
+                self._running = False
+            self.comparison_finished.emit()
+
+    @staticmethod
+    def _encode(image_path, payload):
+        # OpenCV is only loaded here, off the GUI thread
+        import cv2
+        from .payload import encode_payload
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not read image {image_path}")
+        return encode_payload(image, payload.get('max_edge', 1024), payload.get('image_format', 'jpeg'),
+                              payload.get('quality', 90))
+
+    def _run_target(self, index, url, model, payload, generate_uri, timeout, cancel):
+        from .ollama_client import OllamaClient
+        client = OllamaClient(url, timeout=timeout, max_retries=0, max_in_flight=1)
+        text = ""
+        streamed = 0
+        first_token = None
+        last_update = 0.0
+        final = {}
+        started = time.perf_counter()
+        try:
+            stream = client.generate_stream(payload, generate_uri)
+            try:
+                for chunk in stream:
+                    if cancel.is_set():
+                        raise InterruptedError("Stopped")
+                    piece = chunk.get('response', '')
+                    if piece:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        streamed += 1
+                        text += piece
+                        if time.perf_counter() - last_update >= UPDATE_INTERVAL:
+                            last_update = time.perf_counter()
+                            self.response_update.emit(index, text)
+                    if chunk.get('done'):
+                        final = chunk
+            finally:
+                # Stops generation on the server when we end early
+                stream.close()
+        except Exception as e:
+            self.response_update.emit(index, text)
+            self.target_failed.emit(index, str(e))
+            return
+        finally:
+            client.close()
+        latency = time.perf_counter() - started
+        self.response_update.emit(index, text)
+        self.target_finished.emit(index, measurements(payload, latency, first_token, streamed, final))
+
+
+def measurements(payload, latency, first_token, streamed, final):
+    """Per-target numbers from client timings and the fields of Ollama's final chunk.
+
+    Tokens per second come from Ollama's ``eval_count``/``eval_duration``
+    when the server reports them, and from the streamed chunks over the
+    time after the first token otherwise.
+    """
+    tokens = final.get('eval_count') or streamed
+    eval_seconds = (final.get('eval_duration') or 0) / 1e9
+    if not eval_seconds and first_token is not None:
+        eval_seconds = latency - first_token
+    return {
+        'payload_bytes': sum(len(image) for image in payload['images']),
+        'ttft_s': None if first_token is None else round(first_token, 3),
+        'latency_s': round(latency, 3),
+        'tokens': tokens,
+        'tokens_per_sec': round(tokens / eval_seconds, 1) if tokens and eval_seconds > 0 else None,
+        'load_s': round(final['load_duration'] / 1e9, 3) if final.get('load_duration') else None
+    }
@@ -0,0 +1,88 @@
+import json
+import os
+import queue
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+from .ai_cache import default_cache_path
+
+
+def default_models_path():
+    return os.path.join(os.path.dirname(default_cache_path()), 'models.json')
+
+
+class ModelDiscovery(QObject):
+    """Looks up the models of an Ollama server on a background thread.
+
+    ``cached`` returns the list last seen for a URL straight from disk, so
+    the settings can show it before the server has answered. ``refresh``
+    queues a lookup of ``/api/tags`` with short timeouts; the answer arrives
+    as ``models_loaded`` or ``discovery_failed``. When several lookups are
+    queued only the newest one runs.
+    """
+
+    models_loaded = pyqtSignal(str, list)  # url, [{'name': ..., 'families': [...]}, ...]
+    discovery_failed = pyqtSignal(str, str)  # url, error message
+
+    def __init__(self, path=None, timeout=5, connect_timeout=2):
+        super().__init__()
+        self.path = path or default_models_path()
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._models = self._load()
+        self._requests = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @staticmethod
+    def _key(url):
+        return url.strip().rstrip('/')
+
+    def _load(self):
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as cache_file:
+            json.dump(self._models, cache_file)
+        os.replace(temp_path, self.path)
+
+    def cached(self, url):
+        with self._lock:
+            return list(self._models.get(self._key(url), []))
+
+    def refresh(self, url):
+        self._requests.put(url)
+
+    def _run(self):
+        # requests is only loaded here, off the GUI thread
+        from .ollama_client import OllamaClient
+        while True:
+            url = self._requests.get()
+            while not self._requests.empty():
+                url = self._requests.get()
+            try:
+                client = OllamaClient(self._key(url), timeout=self.timeout, connect_timeout=self.connect_timeout,
+                                      max_retries=0)
+                try:
+                    tags = client.tags()
+                finally:
+                    client.close()
+            except Exception as e:
+                self.discovery_failed.emit(url, str(e))
+                continue
+            models = [{'name': model['name'], 'families': (model.get('details') or {}).get('families') or []}
+                      for model in tags]
+            with self._lock:
+                self._models[self._key(url)] = models
+                try:
+                    self._save()
+                except OSError:
+                    pass
+            self.models_loaded.emit(url, models)
@@ -0,0 +1,249 @@
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class OllamaError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class OllamaClient:
+    """Shared Ollama HTTP client.
+
+    Keeps connections alive through one pooled session, limits the number of
+    requests in flight, and retries connection errors, timeouts and 5xx
+    responses with exponential backoff.
+    """
+
+    def __init__(self, base_url, timeout=120, connect_timeout=5, max_retries=3, backoff=0.5, max_in_flight=4):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_in_flight = max(1, max_in_flight)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _send(self, method, path, **kwargs):
+        url = f"{self.base_url}{path}"
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code < 500:
+                    break
+                error = OllamaError(f"{response.status_code} - {response.text[:200]}", response.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = OllamaError(f"{type(e).__name__}: {e}")
+            if attempt >= self.max_retries:
+                raise error
+            # Exponential backoff with jitter so parallel workers don't retry in lockstep
+            time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+        if response.status_code != 200:
+            raise OllamaError(f"{response.status_code} - {response.text[:200]}", response.status_code)
+        return response
+
+    def request(self, method, path, **kwargs):
+        with self._slots:
+            return self._send(method, path, **kwargs)
+
+    def generate(self, payload, generate_uri='/api/generate'):
+        return self.request('POST', generate_uri, json=dict(payload, stream=False)).json()
+
+    def generate_stream(self, payload, generate_uri='/api/generate'):
+        """Yield response chunks as Ollama produces them.
+
+        Closing the generator early closes the connection, which makes Ollama
+        stop generating. Retries only happen before the first chunk arrives.
+        """
+        with self._slots:
+            response = self._send('POST', generate_uri, json=dict(payload, stream=True), stream=True)
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if 'error' in chunk:
+                        raise OllamaError(chunk['error'], response.status_code)
+                    yield chunk
+                    if chunk.get('done'):
+                        break
+            except requests.RequestException as e:
+                raise OllamaError(f"{type(e).__name__}: {e}")
+            finally:
+                response.close()
+
+    def tags(self):
+        return self.request('GET', '/api/tags').json().get('models', [])
+
+    def ping(self, timeout=3):
+        # Single health probe without retries or waiting for a request slot
+        try:
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
+        except requests.RequestException:
+            return False
+        return response.status_code == 200
+
+    def close(self):
+        self.session.close()
+
+
+class Endpoint:
+    def __init__(self, client):
+        self.client = client
+        self.healthy = True
+        self.outstanding = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.started = time.monotonic()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'url': self.client.base_url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_latency': round(self.total_latency / self.completed, 3) if self.completed else None,
+            'requests_per_sec': round(self.completed / elapsed, 3) if elapsed > 0 else 0.0
+        }
+
+
+def _is_endpoint_failure(error):
+    # Connection problems and server errors count against the node; 4xx means a bad request
+    return error.status_code is None or error.status_code >= 500
+
+
+class LoadBalancedClient:
+    """Spreads requests over several Ollama hosts.
+
+    Each request goes to the healthy endpoint with the fewest outstanding
+    requests. A background thread probes ``/api/tags`` every
+    ``health_interval`` seconds, taking dead nodes out of rotation and
+    putting recovered ones back. Exposes the same request methods as
+    OllamaClient.
+    """
+
+    def __init__(self, base_urls, health_interval=10, **client_kwargs):
+        self.endpoints = [Endpoint(OllamaClient(url, **client_kwargs)) for url in base_urls]
+        self.max_in_flight = sum(endpoint.client.max_in_flight for endpoint in self.endpoints)
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._health_thread = None
+        if health_interval and len(self.endpoints) > 1:
+            self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_interval):
+            self.check_health()
+
+    def check_health(self):
+        for endpoint in self.endpoints:
+            healthy = endpoint.client.ping()
+            with self._lock:
+                endpoint.healthy = healthy
+
+    def _acquire(self, exclude):
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates:
+                # Every node looks down: still try the ones we haven't tried this time
+                candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda e: e.outstanding)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint, started, error=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None:
+                endpoint.completed += 1
+                endpoint.total_latency += time.monotonic() - started
+            else:
+                endpoint.failed += 1
+                if _is_endpoint_failure(error):
+                    endpoint.healthy = False
+
+    def _call(self, method, *args, **kwargs):
+        tried = []
+        error = OllamaError("No Ollama endpoints configured")
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise error
+            tried.append(endpoint)
+            started = time.monotonic()
+            try:
+                result = getattr(endpoint.client, method)(*args, **kwargs)
+            except OllamaError as e:
+                self._release(endpoint, started, e)
+                if not _is_endpoint_failure(e):
+                    raise
+                error = e
+                continue
+            self._release(endpoint, started)
+            return result
+
+    def request(self, method, path, **kwargs):
+        return self._call('request', method, path, **kwargs)
+
+    def generate(self, payload, generate_uri='/api/generate'):
+        return self._call('generate', payload, generate_uri)
+
+    def generate_stream(self, payload, generate_uri='/api/generate'):
+        # Fails over to another node only until the first chunk has been received
+        tried = []
+        error = OllamaError("No Ollama endpoints configured")
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise error
+            tried.append(endpoint)
+            started = time.monotonic()
+            received = False
+            try:
+                for chunk in endpoint.client.generate_stream(payload, generate_uri):
+                    received = True
+                    yield chunk
+            except OllamaError as e:
+                self._release(endpoint, started, e)
+                if received or not _is_endpoint_failure(e):
+                    raise
+                error = e
+                continue
+            except BaseException:
+                # Includes GeneratorExit when the caller stops early
+                self._release(endpoint, started)
+                raise
+            self._release(endpoint, started)
+            return
+
+    def tags(self):
+        return self._call('tags')
+
+    def endpoint_stats(self):
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self):
+        self._closed.set()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
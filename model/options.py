@@ -0,0 +1,14 @@
+# Choices shared by the engine, the CLI and the settings UI. Nothing heavy is imported
+# here, so the GUI can build its widgets before OpenCV is loaded.
+
+DEFAULT_IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.webp']
+
+DEDUP_MODES = ('off', 'skip', 'reuse')
+
+# 'source' keeps each input's own extension
+OUTPUT_FORMATS = {
+    'source': None,
+    'jpeg': '.jpg',
+    'webp': '.webp',
+    'png': '.png'
+}
@@ -0,0 +1,53 @@
+import os
+import threading
+import cv2
+
+from .options import OUTPUT_FORMATS
+
+
+def output_name(image_file, image_format='source'):
+    extension = OUTPUT_FORMATS[image_format]
+    if extension is None:
+        return image_file
+    return os.path.splitext(image_file)[0] + extension
+
+
+def encoder_params(extension, quality=95, png_compression=1):
+    extension = extension.lower()
+    if extension in ('.jpg', '.jpeg'):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    if extension == '.webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    if extension == '.png':
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    return []
+
+
+def encode_output(image, extension, quality=95, png_compression=1):
+    """Encode ``image`` for the output file; quality applies to JPEG and WebP, compression (0-9) to PNG."""
+    ok, buffer = cv2.imencode(extension, image, encoder_params(extension, quality, png_compression))
+    if not ok:
+        raise ValueError(f"Failed to encode {extension} output")
+    return buffer
+
+
+def atomic_write(path, data):
+    """Write ``data`` to a temporary file next to ``path`` and rename it into place.
+
+    Readers of the output directory, including a later resumed run, see
+    either the previous file or the complete new one, never a partial write.
+    """
+    directory, name = os.path.split(path)
+    # Unique per writer thread; the dot prefix and .tmp suffix keep scans and watchers off it
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        # os.open honours the umask, unlike mkstemp's private 0600 files
+        with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666), 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,26 @@
+import base64
+import cv2
+
+PAYLOAD_FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY)
+}
+
+
+def resize_to_max_edge(image, max_edge):
+    height, width = image.shape[:2]
+    long_edge = max(height, width)
+    if not max_edge or long_edge <= max_edge:
+        return image
+    factor = max_edge / long_edge
+    return cv2.resize(image, (max(1, round(width * factor)), max(1, round(height * factor))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def encode_payload(image, max_edge=1024, image_format='jpeg', quality=90):
+    """Resize once to the model input size and encode once; returns the base64 string sent to Ollama."""
+    extension, quality_flag = PAYLOAD_FORMATS[image_format]
+    ok, buffer = cv2.imencode(extension, resize_to_max_edge(image, max_edge), [quality_flag, int(quality)])
+    if not ok:
+        raise ValueError(f"Failed to encode {image_format} payload")
+    return base64.b64encode(buffer).decode('utf-8')
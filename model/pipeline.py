@@ -0,0 +1,241 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_STOP = object()
+
+
+def _error_record(error):
+    return {'final': True, 'outcome': 'error', 'reason': f"Error: {error}"}
+
+
+class Stage:
+    """A thread-pool stage. With ``batch_size`` > 1, ``fn`` receives lists of jobs and records."""
+
+    def __init__(self, fn, workers=1, batch_size=1, batch_wait=0.05, name=None):
+        self.fn = fn
+        self.name = name or getattr(fn, '__name__', 'stage').strip('_')
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+
+
+class StagedPipeline:
+    """Runs jobs through detection and a chain of thread stages connected by bounded queues.
+
+    An optional ``prefilter`` Stage runs on threads before detection; its
+    ``fn(job, detect_args)`` returns None to pass the job on, or a finished
+    record. Detection runs in a process pool (or in-process when
+    detect_workers is 0) on batches of up to ``detect_batch_size`` jobs,
+    sending partial batches after ``detect_batch_wait`` seconds without new
+    jobs; ``detect_fn`` takes a list of argument tuples and returns one
+    record per tuple. If a detection process dies, the batches the pool
+    had come back as errors and a new pool takes the remaining work. A
+    job source that waits for new work can yield None while idle. Each
+    following ``Stage`` runs on its own thread pool. A stage marks a record
+    as finished by setting ``record['final']``; finished records skip the
+    remaining stages. Results are handed to ``on_result`` on the thread
+    that called ``run``. An optional ``on_detected(job, record)`` sees
+    every detection record before it moves on. ``queue_depths`` can be
+    polled from any thread while a run is in progress.
+    """
+
+    def __init__(self, detect_fn, stages, detect_workers=None, detect_initializer=None, detect_initargs=(),
+                 detect_batch_size=1, detect_batch_wait=0.05, prefilter=None, queue_size=None, on_detected=None):
+        self.detect_fn = detect_fn
+        self.stages = stages
+        self.detect_workers = (os.cpu_count() or 1) if detect_workers is None else detect_workers
+        self.detect_initializer = detect_initializer
+        self.detect_initargs = detect_initargs
+        self.detect = Stage(detect_fn, self.detect_workers, detect_batch_size, detect_batch_wait)
+        self.prefilter = prefilter
+        self.on_detected = on_detected
+        self.queue_size = queue_size or 2 * max([self.detect_workers, self.detect.batch_size] +
+                                                [stage.workers * stage.batch_size for stage in stages])
+        self._queues = {}
+
+    def queue_depths(self):
+        """Entries waiting in each queue of the current run; 'detect_in_flight' counts submitted batches."""
+        return {name: inbox.qsize() for name, inbox in list(self._queues.items())}
+
+    def _make_detect_executor(self):
+        if self.detect_workers <= 0:
+            return ThreadPoolExecutor(max_workers=1, initializer=self.detect_initializer,
+                                      initargs=self.detect_initargs)
+        # spawn keeps the workers clear of the GUI's threads and Qt state
+        return ProcessPoolExecutor(max_workers=self.detect_workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=self.detect_initializer, initargs=self.detect_initargs)
+
+    def run(self, jobs, on_result, should_continue=lambda: True):
+        pending = queue.Queue(maxsize=self.queue_size)
+        detect_inbox = queue.Queue(maxsize=self.queue_size)
+        prefilter_inbox = queue.Queue(maxsize=self.queue_size)
+        inboxes = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = queue.Queue()
+        self._queues = {'detect': detect_inbox, 'detect_in_flight': pending, 'results': results}
+        if self.prefilter is not None:
+            self._queues[self.prefilter.name] = prefilter_inbox
+        self._queues.update((stage.name, inbox) for stage, inbox in zip(self.stages, inboxes))
+        executors = [self._make_detect_executor()]  # the last one is current; earlier ones broke
+        # Detection batches not finished yet, cancelled by hand on exit (shutdown's cancel_futures needs 3.9)
+        unfinished = set()
+
+        def forward(index, job, record):
+            if record.get('final') or index >= len(inboxes):
+                results.put((job, record))
+            else:
+                inboxes[index].put((job, record))
+
+        def feed():
+            target = detect_inbox if self.prefilter is None else prefilter_inbox
+            try:
+                for entry in jobs:
+                    if not should_continue():
+                        break
+                    # An idle source yields None; partial batches go out after batch_wait anyway
+                    if entry is not None:
+                        target.put(entry)
+            except Exception as e:
+                results.put((None, _error_record(e)))
+
+        def take_batch(stage, inbox):
+            # Block for the first entry, then wait briefly for the batch to fill up
+            entry = inbox.get()
+            if entry is _STOP:
+                return [], True
+            batch = [entry]
+            while len(batch) < stage.batch_size:
+                try:
+                    entry = inbox.get(timeout=stage.batch_wait)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    return batch, True
+                batch.append(entry)
+            return batch, False
+
+        def prefilter():
+            while True:
+                entry = prefilter_inbox.get()
+                if entry is _STOP:
+                    break
+                if not should_continue():
+                    continue
+                job, args = entry
+                try:
+                    record = self.prefilter.fn(job, args)
+                except Exception as e:
+                    record = _error_record(e)
+                if record is None:
+                    detect_inbox.put(entry)
+                else:
+                    results.put((job, record))
+
+        def submit_batch(args):
+            try:
+                future = executors[-1].submit(self.detect_fn, args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory) and the pool takes no more work; start a fresh one.
+                # The broken pool has already failed everything it still held.
+                executors[-1].shutdown(wait=False)
+                executors.append(self._make_detect_executor())
+                future = executors[-1].submit(self.detect_fn, args)
+            unfinished.add(future)
+            future.add_done_callback(unfinished.discard)
+            return future
+
+        def submit():
+            stopped = False
+            try:
+                while not stopped:
+                    batch, stopped = take_batch(self.detect, detect_inbox)
+                    batch = [entry for entry in batch if should_continue()]
+                    if not batch:
+                        continue
+                    try:
+                        future = submit_batch([args for _, args in batch])
+                    except Exception as e:
+                        # collect turns the failure into an error record per job
+                        future = Future()
+                        future.set_exception(e)
+                    pending.put(([job for job, _ in batch], future))
+            finally:
+                pending.put(_STOP)
+
+        def collect():
+            while True:
+                entry = pending.get()
+                if entry is _STOP:
+                    break
+                batch_jobs, future = entry
+                try:
+                    records = future.result()
+                except Exception as e:
+                    records = [_error_record(e) for _ in batch_jobs]
+                for job, record in zip(batch_jobs, records):
+                    if self.on_detected is not None:
+                        self.on_detected(job, record)
+                    forward(0, job, record)
+
+        def work(index, stage):
+            inbox = inboxes[index]
+            stopped = False
+            while not stopped:
+                batch, stopped = take_batch(stage, inbox)
+                batch = [entry for entry in batch if should_continue()]
+                if not batch:
+                    continue
+                batch_jobs = [job for job, _ in batch]
+                try:
+                    if stage.batch_size > 1:
+                        records = stage.fn(batch_jobs, [record for _, record in batch])
+                    else:
+                        records = [stage.fn(*batch[0])]
+                except Exception as e:
+                    records = [_error_record(e) for _ in batch]
+                for job, record in zip(batch_jobs, records):
+                    forward(index + 1, job, record)
+
+        def coordinate():
+            # Shut down front to back so every queued job drains through the later stages
+            feed_thread.join()
+            for _ in prefilter_threads:
+                prefilter_inbox.put(_STOP)
+            for thread in prefilter_threads:
+                thread.join()
+            detect_inbox.put(_STOP)
+            for thread in detect_threads:
+                thread.join()
+            for inbox, threads in zip(inboxes, stage_threads):
+                for _ in threads:
+                    inbox.put(_STOP)
+                for thread in threads:
+                    thread.join()
+            results.put(_STOP)
+
+        feed_thread = threading.Thread(target=feed, daemon=True)
+        prefilter_threads = [threading.Thread(target=prefilter, daemon=True)
+                             for _ in range(self.prefilter.workers if self.prefilter is not None else 0)]
+        detect_threads = [threading.Thread(target=submit, daemon=True), threading.Thread(target=collect, daemon=True)]
+        stage_threads = [[threading.Thread(target=work, args=(index, stage), daemon=True) for _ in range(stage.workers)]
+                         for index, stage in enumerate(self.stages)]
+        threads = [feed_thread] + prefilter_threads + detect_threads
+        threads += [thread for threads in stage_threads for thread in threads]
+        threads.append(threading.Thread(target=coordinate, daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                entry = results.get()
+                if entry is _STOP:
+                    break
+                on_result(*entry)
+        finally:
+            for future in list(unfinished):
+                future.cancel()
+            for executor in executors:
+                executor.shutdown(wait=True)
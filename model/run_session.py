@@ -0,0 +1,106 @@
+import threading
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QImage
+
+
+class RunSession(QObject):
+    """Carries one processing run's events from the worker to the GUI.
+
+    The engine callbacks only buffer events, from whichever thread they run
+    on. A timer on the GUI thread flushes the buffer at most ``rate`` times
+    a second: finished images arrive as one list, and only the newest
+    progress, status, preview and caption are delivered. After
+    ``processing_finished`` or ``processing_failed`` the session disconnects
+    its signals and is deleted, so connections made to it last exactly one
+    run.
+    """
+
+    results_ready = pyqtSignal(list)  # [(image file, success, reason, cropped, AI response), ...]
+    progress_update = pyqtSignal(int)
+    status_update = pyqtSignal(str)
+    current_image_update = pyqtSignal(str, QImage)  # image path, preview thumbnail
+    caption_progress = pyqtSignal(str, str)  # image file, caption text so far
+    metrics_update = pyqtSignal(dict)  # RunMetrics.snapshot()
+    processing_finished = pyqtSignal(dict)
+    processing_failed = pyqtSignal(str)  # error message; ends the session like processing_finished
+
+    def __init__(self, rate=10, parent=None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._results = []
+        self._latest = {}
+        self._stats = None
+        self._error = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(max(1, int(1000 / rate)))
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def _set_latest(self, event, *args):
+        with self._lock:
+            self._latest[event] = args
+
+    # Engine callbacks, called on worker threads
+
+    def on_image_processed(self, *result):
+        with self._lock:
+            self._results.append(result)
+
+    def on_progress(self, value):
+        self._set_latest('progress', value)
+
+    def on_status(self, message):
+        self._set_latest('status', message)
+
+    def on_current_image(self, image_path, thumbnail):
+        self._set_latest('current_image', image_path, thumbnail)
+
+    def on_caption_token(self, image_file, caption):
+        self._set_latest('caption', image_file, caption)
+
+    def on_metrics(self, snapshot):
+        self._set_latest('metrics', snapshot)
+
+    def on_finished(self, stats):
+        with self._lock:
+            self._stats = stats
+
+    def on_error(self, message):
+        with self._lock:
+            self._error = message
+
+    # GUI thread
+
+    def flush(self):
+        with self._lock:
+            results, self._results = self._results, []
+            latest, self._latest = self._latest, {}
+            stats, self._stats = self._stats, None
+            error, self._error = self._error, None
+        if results:
+            self.results_ready.emit(results)
+        if 'progress' in latest:
+            self.progress_update.emit(*latest['progress'])
+        if 'status' in latest:
+            self.status_update.emit(*latest['status'])
+        if 'current_image' in latest:
+            image_path, thumbnail = latest['current_image']
+            self.current_image_update.emit(image_path, self._to_qimage(thumbnail))
+        if 'caption' in latest:
+            self.caption_progress.emit(*latest['caption'])
+        if 'metrics' in latest:
+            self.metrics_update.emit(*latest['metrics'])
+        if stats is not None or error is not None:
+            self._timer.stop()
+            if error is not None:
+                self.processing_failed.emit(error)
+            else:
+                self.processing_finished.emit(stats)
+            self.disconnect()
+            self.deleteLater()
+
+    @staticmethod
+    def _to_qimage(thumbnail):
+        # BGR pixels read as RGB and swapped back; rgbSwapped() also detaches from the buffer
+        height, width = thumbnail.shape[:2]
+        return QImage(thumbnail.tobytes(), width, height, 3 * width, QImage.Format_RGB888).rgbSwapped()
@@ -0,0 +1,129 @@
+import os
+import threading
+
+
+def _is_image(name, extensions):
+    return name.lower().endswith(extensions)
+
+
+def _excluded(path, excluded):
+    return bool(excluded) and os.path.realpath(path) in excluded
+
+
+def scan_images(folders, extensions, recursive=False, exclude=(), on_directory=None):
+    """Yield ``(path, stat)`` for each image under ``folders`` as soon as it is found.
+
+    One ``os.scandir`` pass per directory; subdirectories are walked when
+    ``recursive`` is set, skipping symlinked directories and anything in
+    ``exclude``. Unreadable directories are skipped. ``on_directory`` is
+    called with each directory before it is listed.
+    """
+    extensions = tuple(extensions)
+    excluded = {os.path.realpath(path) for path in exclude}
+    for folder in folders:
+        stack = [folder]
+        while stack:
+            directory = stack.pop()
+            subdirs = []
+            if on_directory is not None:
+                on_directory(directory)
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if recursive and entry.is_dir(follow_symlinks=False):
+                                if not _excluded(entry.path, excluded):
+                                    subdirs.append(entry.path)
+                            elif _is_image(entry.name, extensions) and entry.is_file():
+                                yield entry.path, entry.stat()
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            # Walk subdirectories in name order
+            stack.extend(sorted(subdirs, reverse=True))
+
+
+class DirectoryCountCache:
+    """Image counts per directory, reused while the directory's mtime is unchanged.
+
+    Adding, removing or renaming an entry updates its directory's mtime, so
+    recounting an unchanged tree costs one ``stat`` per directory.
+    """
+
+    def __init__(self, extensions):
+        self.extensions = tuple(extensions)
+        self._lock = threading.Lock()
+        self._entries = {}  # directory -> (mtime_ns, image count, subdirectories)
+
+    def _scan(self, directory):
+        mtime = os.stat(directory).st_mtime_ns
+        with self._lock:
+            cached = self._entries.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        count = 0
+        subdirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif _is_image(entry.name, self.extensions) and entry.is_file():
+                        count += 1
+                except OSError:
+                    continue
+        with self._lock:
+            self._entries[directory] = (mtime, count, subdirs)
+        return count, subdirs
+
+    def count(self, folder, recursive=False, exclude=(), on_progress=None):
+        """Count the images under ``folder``; ``on_progress`` receives the running total."""
+        excluded = {os.path.realpath(path) for path in exclude}
+        total = 0
+        stack = [folder]
+        while stack:
+            try:
+                count, subdirs = self._scan(stack.pop())
+            except OSError:
+                continue
+            total += count
+            if on_progress is not None:
+                on_progress(total)
+            if recursive:
+                stack.extend(subdir for subdir in subdirs if not _excluded(subdir, excluded))
+        return total
+
+
+class BackgroundCounter:
+    """Counts the images under several folders on a daemon thread.
+
+    ``estimate(found)`` gives the best total known so far: the larger of
+    the (possibly partial) count and the number of images the caller has
+    already found itself, which keeps growing in watch mode.
+    """
+
+    def __init__(self, cache, folders, recursive=False, exclude=()):
+        self.cache = cache
+        self.folders = list(folders)
+        self.recursive = recursive
+        self.exclude = exclude
+        self.counted = 0
+        self.done = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        base = 0
+        for folder in self.folders:
+            def on_progress(total, base=base):
+                self.counted = base + total
+            base += self.cache.count(folder, self.recursive, self.exclude, on_progress)
+            self.counted = base
+        self.done = True
+
+    def estimate(self, found):
+        return max(self.counted, found)
@@ -0,0 +1,118 @@
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+import time
+
+EXPORT_MODES = ('files', 'shards')
+
+
+def sample_key(image_file):
+    # WebDataset keys end at the first dot after the last slash: subfolders stay as slashes, dots are replaced
+    return re.sub(r'[^\w/-]', '_', os.path.splitext(image_file)[0].replace(os.sep, '/'))
+
+
+class ShardWriter:
+    """Writes samples into size-bounded tar shards, WebDataset style.
+
+    Each sample is a group of members sharing a key (``face1.jpg``,
+    ``face1.txt``, ``face1.json``). Shards go to ``shard-NNNNNN.tar`` in
+    ``directory`` and a new one is started once adding a sample would take
+    the current one past ``max_shard_bytes``. Every sample is flushed to its
+    shard and appended to ``index.jsonl`` as it is added, with the byte
+    offset and size of each member, so readers can seek straight to a sample
+    and everything up to the last flush is usable if the run is cut short.
+    Later runs into the same directory continue with the next shard number.
+    """
+
+    INDEX_NAME = 'index.jsonl'
+
+    def __init__(self, directory, max_shard_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_shard_bytes = max_shard_bytes
+        self._lock = threading.Lock()
+        self._tar = None
+        self._file = None
+        self._shard_name = None
+        self._shard_samples = 0
+        self.shards_written = 0
+        self._entries = {}  # key -> index entry
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, self.INDEX_NAME)
+        cut_off = False
+        if os.path.exists(index_path):
+            with open(index_path) as index:
+                for line in index:
+                    cut_off = not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut off by an interrupted run
+                        continue
+                    self._entries[entry['key']] = entry
+        numbers = [int(name[6:12]) for name in os.listdir(directory) if re.fullmatch(r'shard-\d{6}\.tar', name)]
+        self._next_shard = max(numbers, default=-1) + 1
+        self._index = open(index_path, 'a')
+        if cut_off:
+            # New entries start on a line of their own, not glued to the cut-off one
+            self._index.write('\n')
+
+    def _open_shard(self):
+        self._shard_name = f"shard-{self._next_shard:06d}.tar"
+        self._next_shard += 1
+        self._file = open(os.path.join(self.directory, self._shard_name), 'wb')
+        self._tar = tarfile.open(fileobj=self._file, mode='w')
+        self._shard_samples = 0
+        self.shards_written += 1
+
+    def _close_shard(self):
+        if self._tar is not None:
+            # Writes the end-of-archive blocks; tarfile leaves the file object to us
+            self._tar.close()
+            self._file.close()
+            self._tar = self._file = None
+
+    def add(self, key, members):
+        """Add one sample; ``members`` maps extensions (``'jpg'``, ``'txt'``, ...) to bytes."""
+        size = sum(512 + (len(data) + 511) // 512 * 512 for data in members.values())
+        with self._lock:
+            if self._tar is None or (self._shard_samples and self._tar.offset + size > self.max_shard_bytes):
+                self._close_shard()
+                self._open_shard()
+            offsets = {}
+            for extension, data in members.items():
+                info = tarfile.TarInfo(f"{key}.{extension}")
+                info.size = len(data)
+                info.mtime = int(time.time())
+                info.mode = 0o644
+                self._tar.addfile(info, io.BytesIO(data))
+                # The member's data ends the archive so far, padded to a whole block
+                offsets[extension] = [self._tar.offset - (len(data) + 511) // 512 * 512, len(data)]
+            self._shard_samples += 1
+            self._file.flush()
+            entry = {'key': key, 'shard': self._shard_name, 'members': offsets}
+            self._entries[key] = entry
+            self._index.write(json.dumps(entry) + "\n")
+            self._index.flush()
+
+    def read(self, key):
+        """Return the members of an earlier sample as ``{extension: bytes}``, or None if unknown."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._file is not None and entry['shard'] == self._shard_name:
+                self._file.flush()
+        members = {}
+        with open(os.path.join(self.directory, entry['shard']), 'rb') as shard:
+            for extension, (offset, size) in entry['members'].items():
+                shard.seek(offset)
+                members[extension] = shard.read(size)
+        return members
+
+    def close(self):
+        with self._lock:
+            self._close_shard()
+            self._index.close()
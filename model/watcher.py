@@ -0,0 +1,233 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from .scanner import _excluded, _is_image, scan_images
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """Minimal ctypes binding for Linux inotify."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}  # watch descriptor -> directory
+
+    def add(self, directory):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+        self.directories[wd] = directory
+
+    def read(self, timeout):
+        """Return ``(directory, name, mask)`` events, or None when the kernel queue overflowed."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+            elif wd in self.directories:
+                events.append((self.directories[wd], name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_inotify():
+    if not hasattr(os, 'O_CLOEXEC') or ctypes.util.find_library('c') is None:
+        return None
+    try:
+        return Inotify()
+    except (OSError, AttributeError):
+        return None
+
+
+class FolderWatcher:
+    """Reports new and changed images in a set of folders.
+
+    ``scan()`` yields the images already present and starts watching each
+    directory before listing it, so nothing dropped during the scan is
+    missed. ``changes()`` then yields ``(path, stat)`` for every file that
+    appeared or changed, once its size and mtime have held still for
+    ``debounce`` seconds, and None whenever it is idle.
+
+    Uses inotify on Linux. Elsewhere, or for directories inotify cannot
+    watch, each directory's mtime is polled every ``poll_interval`` seconds
+    and only directories that changed are listed again.
+    """
+
+    def __init__(self, folders, extensions, recursive=False, exclude=(), debounce=2.0, poll_interval=1.0,
+                 use_inotify=True):
+        self.folders = list(folders)
+        self.extensions = tuple(extensions)
+        self.recursive = recursive
+        self.excluded = {os.path.realpath(path) for path in exclude}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.inotify = open_inotify() if use_inotify else None
+        self._polled = {}  # directory -> mtime_ns, for directories without an inotify watch
+        self._seen = {}  # path -> (mtime_ns, size) last handed out
+        self._pending = {}  # path -> ((mtime_ns, size), time the file was last seen changing)
+
+    @property
+    def mode(self):
+        return 'inotify' if self.inotify is not None else 'polling'
+
+    def _add_directory(self, directory):
+        if self.inotify is not None:
+            try:
+                self.inotify.add(directory)
+                return
+            except OSError:
+                # Typically the per-user watch limit; poll this one instead
+                pass
+        try:
+            self._polled[directory] = os.stat(directory).st_mtime_ns
+        except OSError:
+            pass
+
+    def scan(self):
+        for path, stat in scan_images(self.folders, self.extensions, self.recursive, self.excluded,
+                                      on_directory=self._add_directory):
+            self._seen[path] = (stat.st_mtime_ns, stat.st_size)
+            yield path, stat
+
+    def _scan_new_directory(self, directory):
+        # Files can land in a new directory before its watch exists
+        for path, _ in scan_images([directory], self.extensions, self.recursive, self.excluded,
+                                   on_directory=self._add_directory):
+            self._observe(path)
+
+    def _observe(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._seen.get(path) == key:
+            return
+        pending = self._pending.get(path)
+        if pending is None or pending[0] != key:
+            self._pending[path] = (key, time.monotonic())
+
+    def _handle_events(self, events):
+        if events is None:
+            # Events were dropped: list every watched directory again
+            for directory in sorted(set(self.inotify.directories.values())):
+                self._list_directory(directory)
+            return
+        for directory, name, mask in events:
+            path = os.path.join(directory, name)
+            if mask & IN_DELETE_SELF:
+                continue
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and not _excluded(path, self.excluded):
+                    self._scan_new_directory(path)
+            elif _is_image(name, self.extensions):
+                self._observe(path)
+
+    def _list_directory(self, directory):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive and not self._is_known(entry.path) \
+                                    and not _excluded(entry.path, self.excluded):
+                                self._scan_new_directory(entry.path)
+                        elif _is_image(entry.name, self.extensions) and entry.is_file():
+                            self._observe(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            self._polled.pop(directory, None)
+
+    def _is_known(self, directory):
+        return directory in self._polled or (self.inotify is not None
+                                             and directory in self.inotify.directories.values())
+
+    def _poll_directories(self):
+        for directory, mtime in list(self._polled.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                del self._polled[directory]
+                continue
+            if current != mtime:
+                self._polled[directory] = current
+                self._list_directory(directory)
+
+    def _settled(self):
+        now = time.monotonic()
+        for path, (key, since) in list(self._pending.items()):
+            if now - since < self.debounce:
+                continue
+            self._observe(path)
+            if path in self._pending and self._pending[path][0] == key:
+                del self._pending[path]
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                self._seen[path] = key
+                yield path, stat
+
+    def changes(self, should_continue=lambda: True):
+        last_poll = 0.0
+        while should_continue():
+            timeout = self.poll_interval
+            if self._pending:
+                next_due = min(since for _, since in self._pending.values()) + self.debounce
+                timeout = max(0.05, min(timeout, next_due - time.monotonic()))
+            if self.inotify is not None:
+                self._handle_events(self.inotify.read(timeout))
+            else:
+                time.sleep(timeout)
+            # Pending files are re-checked by _settled; directories are polled at most every poll_interval
+            if self._polled and time.monotonic() - last_poll >= self.poll_interval:
+                last_poll = time.monotonic()
+                self._poll_directories()
+            settled = False
+            for entry in self._settled():
+                settled = True
+                yield entry
+            if not settled:
+                yield None
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
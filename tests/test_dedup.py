@@ -0,0 +1,93 @@
+import random
+import shutil
+import tempfile
+import unittest
+
+from model.dedup import BKTree, DuplicateIndex, hamming
+
+BASE = 0x0123456789ABCDEF
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+class BKTreeTest(unittest.TestCase):
+    """BKTree.search finds exactly the hashes within the distance."""
+
+    def test_threshold_is_inclusive(self):
+        tree = BKTree()
+        for distance in range(6):
+            tree.add(flip(BASE, *range(distance)), distance)
+        for max_distance in range(6):
+            with self.subTest(max_distance=max_distance):
+                found = sorted(item for _, _, item in tree.search(BASE, max_distance))
+                self.assertEqual(found, list(range(max_distance + 1)))
+
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        # Clusters of near hashes around a few centres, like bursts of similar photos
+        centres = [rng.getrandbits(64) for _ in range(8)]
+        values = [flip(rng.choice(centres), *rng.sample(range(64), rng.randint(0, 10))) for _ in range(300)]
+        tree = BKTree()
+        for index, value in enumerate(values):
+            tree.add(value, index)
+        for query in centres + values[:20]:
+            for max_distance in (0, 2, 4, 8):
+                expected = sorted(index for index, value in enumerate(values) if hamming(query, value) <= max_distance)
+                found = sorted(item for _, _, item in tree.search(query, max_distance))
+                self.assertEqual(found, expected)
+
+    def test_empty_tree(self):
+        self.assertEqual(BKTree().search(BASE, 64), [])
+
+
+class DuplicateIndexTest(unittest.TestCase):
+    """DuplicateIndex.match claims new hashes and returns the closest usable original."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open_index(self, fingerprint='settings'):
+        index = DuplicateIndex(self.directory, fingerprint)
+        self.addCleanup(index.close)
+        return index
+
+    def test_match_within_distance(self):
+        index = self.open_index()
+        self.assertIsNone(index.match('original.jpg', BASE, 4))
+        index.finish('original.jpg', 'processed', "Processed successfully")
+        self.assertEqual(index.match('copy.jpg', flip(BASE, 1, 2, 3, 4), 4)[0], 'original.jpg')
+        # One bit further is a different image, which claims its own hash
+        self.assertIsNone(index.match('other.jpg', flip(BASE, 1, 2, 3, 4, 5), 4))
+
+    def test_closest_original_wins(self):
+        index = self.open_index()
+        for path, value in (('far.jpg', flip(BASE, 1, 2, 3)), ('near.jpg', flip(BASE, 1))):
+            index.match(path, value, 0)
+            index.finish(path, 'processed')
+        self.assertEqual(index.match('copy.jpg', BASE, 4)[0], 'near.jpg')
+
+    def test_errored_originals_are_not_matched(self):
+        index = self.open_index()
+        index.match('broken.jpg', BASE, 4)
+        index.finish('broken.jpg', 'error', "Error: timeout")
+        self.assertIsNone(index.match('copy.jpg', BASE, 4))
+
+    def test_reopened_index_keeps_only_its_settings(self):
+        index = self.open_index()
+        index.match('original.jpg', BASE, 4)
+        index.finish('original.jpg', 'processed', "Processed successfully", 'yes', True)
+        index.close()
+
+        original, entry = self.open_index().match('copy.jpg', BASE, 4)
+        self.assertEqual(original, 'original.jpg')
+        self.assertEqual((entry['outcome'], entry['ai_response'], entry['was_cropped']), ('processed', 'yes', True))
+        self.assertIsNone(self.open_index('other settings').match('copy.jpg', BASE, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
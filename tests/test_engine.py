@@ -0,0 +1,194 @@
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.mock_ollama import MockOllamaServer
+from model.ai_cache import ResponseCache, make_cache_key
+from model.engine import VALIDATION_PROMPT, VALIDATION_TOKENS, ProcessingEngine
+from model.image_probe import probe_size
+from model.metrics import ThreadProfiler
+
+
+class RecursiveOutputTest(unittest.TestCase):
+    """Same-named images in different subfolders of a recursive scan get separate outputs."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.input_dir = os.path.join(self.directory, 'input')
+        self.output_dir = os.path.join(self.directory, 'output')
+        for seed, folder in enumerate(('a', 'b')):
+            path, = generate_corpus(os.path.join(self.input_dir, folder), 1, formats=('jpg',), face_ratio=1.0,
+                                    seed=seed)
+            os.rename(path, os.path.join(os.path.dirname(path), 'IMG_0001.jpg'))
+
+    def run_engine(self, **export_params):
+        engine = ProcessingEngine()
+        engine.set_parameters([self.input_dir], self.output_dir, 0, 0, False, None, False, False)
+        engine.set_scan_params(recursive=True)
+        engine.set_pipeline_params(detect_workers=1, ai_workers=1, write_workers=1)
+        engine.set_export_params(**export_params)
+        engine.set_metrics_params(run_report=False)
+        return sorted((image_file, success) for image_file, success, *_ in engine.results())
+
+    def test_files_mirror_subfolders(self):
+        results = self.run_engine()
+        self.assertEqual(results, [(os.path.join('a', 'IMG_0001.jpg'), True),
+                                   (os.path.join('b', 'IMG_0001.jpg'), True)])
+        outputs = []
+        for folder in ('a', 'b'):
+            with open(os.path.join(self.output_dir, folder, 'IMG_0001.jpg'), 'rb') as output:
+                outputs.append(output.read())
+        self.assertNotEqual(outputs[0], outputs[1])
+
+    def test_shard_keys_keep_subfolders(self):
+        self.run_engine(mode='shards')
+        with open(os.path.join(self.output_dir, 'shards', 'index.jsonl')) as index:
+            keys = sorted(json.loads(line)['key'] for line in index)
+        self.assertEqual(keys, ['a/IMG_0001', 'b/IMG_0001'])
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """Only answers the engine could parse are served from the response cache."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.server = MockOllamaServer(latency=0).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.engine = ProcessingEngine()
+        self.engine.set_api_params({'url': self.server.url, 'max_retries': '0'})
+        self.engine.cache = ResponseCache(os.path.join(directory, 'responses.sqlite3'))
+        self.addCleanup(self.engine.cache.close)
+        self.key = make_cache_key('payload', 'default', VALIDATION_PROMPT,
+                                  self.engine.generation_options(VALIDATION_TOKENS))
+
+    def test_unusable_cached_answer_is_asked_again(self):
+        self.engine.cache.put(self.key, 'No response generated')
+        self.assertEqual(self.engine.validate_image(None, 'payload'), (True, 'yes'))
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.engine.cache.get(self.key), 'yes')
+
+        # The usable answer now comes from the cache
+        self.assertEqual(self.engine.validate_image(None, 'payload'), (True, 'yes'))
+        self.assertEqual(self.server.requests, 1)
+
+    def test_unusable_answer_is_not_cached(self):
+        response = self.engine.make_ai_request('payload', VALIDATION_PROMPT, num_predict=VALIDATION_TOKENS,
+                                               cache_if=lambda text: False)
+        self.assertEqual(response, 'yes')
+        self.assertIsNone(self.engine.cache.get(self.key))
+
+
+class ProfiledRunTest(unittest.TestCase):
+    """A run with --profile and several workers per stage processes every image and writes a profile."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.input_dir = os.path.join(directory, 'input')
+        self.output_dir = os.path.join(directory, 'output')
+        self.profile_path = os.path.join(directory, 'run.prof')
+        generate_corpus(self.input_dir, 6, sizes=((320, 240),), face_ratio=1.0)
+
+    def run_engine(self):
+        engine = ProcessingEngine()
+        engine.set_parameters([self.input_dir], self.output_dir, 0, 0, False, None, False, False)
+        engine.set_pipeline_params(detect_workers=2, ai_workers=3, write_workers=3)
+        engine.set_metrics_params(profile_path=self.profile_path, run_report=False)
+        results = list(engine.results())
+        self.assertEqual(len(results), 6)
+        self.assertEqual(sum(1 for _, success, *_ in results if success), 6)
+        self.assertTrue(pstats.Stats(self.profile_path).total_calls)
+
+    def test_per_thread_profiles(self):
+        self.run_engine()
+
+    def test_process_wide_profile(self):
+        # The Python 3.12+ path: one profiler for the whole run, stage functions left unwrapped
+        with mock.patch.object(ThreadProfiler, 'PROCESS_WIDE', True):
+            self.run_engine()
+
+
+class FaceCountTest(unittest.TestCase):
+    """Faces are counted when detection finds them, even if the AI step then fails."""
+
+    def test_faces_counted_when_ai_fails(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        input_dir = os.path.join(directory, 'input')
+        generate_corpus(input_dir, 4, sizes=((320, 240),), face_ratio=1.0)
+        server = MockOllamaServer(latency=0, error_rate=1.0).__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        engine = ProcessingEngine()
+        engine.set_parameters([input_dir], os.path.join(directory, 'output'), 0, 0, False, None, True, False)
+        engine.set_api_params({'url': server.url, 'max_retries': '0'})
+        engine.set_cache_params(enabled=False)
+        engine.set_pipeline_params(detect_workers=1, ai_workers=2, write_workers=1)
+        engine.set_metrics_params(run_report=False)
+        summary = []
+        engine.on_finished = summary.append
+        results = list(engine.results())
+        self.assertEqual([success for _, success, *_ in results], [False] * 4)
+        self.assertEqual(summary[0]['errors'], 4)
+        self.assertEqual(summary[0]['faces_found'], 4)
+
+
+class ResumeTest(unittest.TestCase):
+    """Resume skips inputs finished under the same settings and redoes them after a settings change."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.input_dir = os.path.join(directory, 'input')
+        self.output_dir = os.path.join(directory, 'output')
+        generate_corpus(self.input_dir, 3, sizes=((320, 240),), face_ratio=1.0)
+
+    def run_engine(self, min_width=0):
+        engine = ProcessingEngine()
+        engine.set_parameters([self.input_dir], self.output_dir, min_width, 0, False, None, False, False)
+        engine.set_pipeline_params(detect_workers=1, ai_workers=1, write_workers=1)
+        engine.set_metrics_params(run_report=False)
+        engine.set_resume(True)
+        summary = []
+        engine.on_finished = summary.append
+        results = list(engine.results())
+        return len(results), summary[0]['skipped_resumed']
+
+    def test_changed_settings_are_redone(self):
+        self.assertEqual(self.run_engine(), (3, 0))
+        self.assertEqual(self.run_engine(), (0, 3))
+        self.assertEqual(self.run_engine(min_width=100), (3, 0))
+        self.assertEqual(self.run_engine(min_width=100), (0, 3))
+
+
+class HeaderProbeTest(unittest.TestCase):
+    """Each file header is read once per run, by the memory budget, and handed on to detection."""
+
+    def test_header_read_once(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        input_dir = os.path.join(directory, 'input')
+        generate_corpus(input_dir, 3, sizes=((320, 240),), face_ratio=1.0)
+        engine = ProcessingEngine()
+        # A minimum size and a reduced decode are both cases where detection used to probe again
+        engine.set_parameters([input_dir], os.path.join(directory, 'output'), 64, 64, False, None, False, False)
+        engine.set_detection_params(detection_scale=2)
+        # In-process detection, so the patched probes see every call
+        engine.set_pipeline_params(detect_workers=0, ai_workers=1, write_workers=1)
+        engine.set_metrics_params(run_report=False)
+        with mock.patch('model.engine.probe_size', wraps=probe_size) as engine_probe, \
+                mock.patch('model.detection.probe_size', wraps=probe_size) as detection_probe:
+            results = list(engine.results())
+        self.assertEqual(len(results), 3)
+        self.assertEqual(engine_probe.call_count, 3)
+        self.assertEqual(detection_probe.call_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
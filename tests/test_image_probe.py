@@ -0,0 +1,76 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from model.image_probe import probe_size
+
+WIDTH, HEIGHT = 37, 23
+
+
+def exif_orientation_segment(orientation):
+    # APP1 with a little-endian TIFF header and one IFD entry: Orientation (0x0112), SHORT, count 1
+    tiff = b'II*\0' + struct.pack('<I', 8) + struct.pack('<H', 1)
+    tiff += struct.pack('<HHIHH', 0x0112, 3, 1, orientation, 0) + struct.pack('<I', 0)
+    payload = b'Exif\0\0' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+class ProbeSizeTest(unittest.TestCase):
+    """probe_size reads the size from each supported header and gives up on the rest."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.image = np.random.default_rng(0).integers(0, 255, (HEIGHT, WIDTH, 3), np.uint8)
+
+    def write(self, name, params=()):
+        path = os.path.join(self.directory, name)
+        self.assertTrue(cv2.imwrite(path, self.image, list(params)))
+        return path
+
+    def write_bytes(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_encoded_formats(self):
+        for name, params in [('image.jpg', ()), ('image.png', ()), ('image.bmp', ()),
+                             ('lossy.webp', (cv2.IMWRITE_WEBP_QUALITY, 80)),
+                             ('lossless.webp', (cv2.IMWRITE_WEBP_QUALITY, 101))]:
+            with self.subTest(name=name):
+                self.assertEqual(probe_size(self.write(name, params)), (WIDTH, HEIGHT))
+
+    def test_gif_header(self):
+        path = self.write_bytes('image.gif', b'GIF89a' + struct.pack('<HH', WIDTH, HEIGHT) + bytes(22))
+        self.assertEqual(probe_size(path), (WIDTH, HEIGHT))
+
+    def test_jpeg_exif_rotation_swaps_sides(self):
+        with open(self.write('plain.jpg'), 'rb') as f:
+            data = f.read()
+        for orientation, size in [(1, (WIDTH, HEIGHT)), (6, (HEIGHT, WIDTH)), (8, (HEIGHT, WIDTH))]:
+            with self.subTest(orientation=orientation):
+                path = self.write_bytes('rotated.jpg', data[:2] + exif_orientation_segment(orientation) + data[2:])
+                self.assertEqual(probe_size(path), size)
+
+    def test_unsupported_and_broken_files(self):
+        with open(self.write('whole.png'), 'rb') as f:
+            png = f.read()
+        paths = {
+            'tiff': self.write('image.tiff'),
+            'truncated png': self.write_bytes('truncated.png', png[:16]),
+            'jpeg without frame': self.write_bytes('empty.jpg', b'\xff\xd8\xff\xd9' + bytes(28)),
+            'missing': os.path.join(self.directory, 'missing.jpg')
+        }
+        for case, path in paths.items():
+            with self.subTest(case=case):
+                self.assertIsNone(probe_size(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from model.manifest import RunManifest, settings_fingerprint
+
+SETTINGS = {'min_width': 256, 'min_height': 256, 'crop_faces': True}
+
+
+class RunManifestTest(unittest.TestCase):
+    """A reopened manifest reports an input as finished only under the same file and settings."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.fingerprint = settings_fingerprint(SETTINGS)
+
+    def open_manifest(self):
+        manifest = RunManifest(self.directory)
+        self.addCleanup(manifest.close)
+        return manifest
+
+    def reopen_with(self, *records):
+        manifest = self.open_manifest()
+        for record in records:
+            manifest.record(*record)
+        manifest.close()
+        return self.open_manifest()
+
+    def test_resume_under_same_settings(self):
+        manifest = self.reopen_with(('a.jpg', 100.0, 2048, self.fingerprint, 'processed'),
+                                    ('b.jpg', 100.0, 2048, self.fingerprint, 'no_face'))
+        self.assertTrue(manifest.is_finished('a.jpg', 100.0, 2048, self.fingerprint))
+        self.assertTrue(manifest.is_finished('b.jpg', 100.0, 2048, self.fingerprint))
+        self.assertFalse(manifest.is_finished('c.jpg', 100.0, 2048, self.fingerprint))
+
+    def test_changed_fingerprint_is_redone(self):
+        manifest = self.reopen_with(('a.jpg', 100.0, 2048, self.fingerprint, 'processed'))
+        changed = settings_fingerprint(dict(SETTINGS, min_width=512))
+        self.assertNotEqual(changed, self.fingerprint)
+        self.assertFalse(manifest.is_finished('a.jpg', 100.0, 2048, changed))
+
+    def test_changed_file_and_errors_are_redone(self):
+        manifest = self.reopen_with(('a.jpg', 100.0, 2048, self.fingerprint, 'processed'),
+                                    ('b.jpg', 100.0, 2048, self.fingerprint, 'error'))
+        self.assertFalse(manifest.is_finished('a.jpg', 101.0, 2048, self.fingerprint))
+        self.assertFalse(manifest.is_finished('a.jpg', 100.0, 4096, self.fingerprint))
+        self.assertFalse(manifest.is_finished('b.jpg', 100.0, 2048, self.fingerprint))
+
+    def test_latest_record_wins(self):
+        manifest = self.reopen_with(('a.jpg', 100.0, 2048, self.fingerprint, 'error'),
+                                    ('a.jpg', 100.0, 2048, self.fingerprint, 'processed'))
+        self.assertTrue(manifest.is_finished('a.jpg', 100.0, 2048, self.fingerprint))
+
+    def test_fingerprint_ignores_key_order(self):
+        self.assertEqual(settings_fingerprint(dict(reversed(list(SETTINGS.items())))), self.fingerprint)
+
+    def test_cut_off_line_is_skipped(self):
+        self.reopen_with(('a.jpg', 100.0, 2048, self.fingerprint, 'processed')).close()
+        with open(os.path.join(self.directory, RunManifest.FILE_NAME), 'a', encoding='utf-8') as f:
+            f.write('{"path": "b.jpg", "mti')
+        manifest = self.reopen_with(('c.jpg', 100.0, 2048, self.fingerprint, 'processed'))
+        self.assertTrue(manifest.is_finished('a.jpg', 100.0, 2048, self.fingerprint))
+        self.assertFalse(manifest.is_finished('b.jpg', 100.0, 2048, self.fingerprint))
+        self.assertTrue(manifest.is_finished('c.jpg', 100.0, 2048, self.fingerprint))
+
+
+if __name__ == '__main__':
+    unittest.main()
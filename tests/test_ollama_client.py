@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from model.ollama_client import LoadBalancedClient
+
+PAYLOAD = {'model': 'stub-llava:latest', 'prompt': 'Describe the image.', 'images': [], 'stream': False}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._send(200, {'models': [{'name': PAYLOAD['model']}]})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.latency)
+        if server.failing:
+            self._send(500, {'error': 'stub failure'})
+        else:
+            self._send(200, {'model': PAYLOAD['model'], 'response': 'yes', 'done': True})
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    """Local Ollama stand-in that answers every generate after ``latency`` seconds, or with a 500 when ``failing``."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, failing=False):
+        super().__init__(('127.0.0.1', port), _StubHandler)
+        self.latency = latency
+        self.failing = failing
+        self.requests = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class LoadBalancedClientTest(unittest.TestCase):
+    """Runs LoadBalancedClient against several local stub servers."""
+
+    def start_server(self, **kwargs):
+        server = StubOllamaServer(**kwargs)
+        self.addCleanup(server.stop)
+        return server
+
+    def make_client(self, servers, **kwargs):
+        # No background probes: health is checked explicitly where a test needs it
+        client = LoadBalancedClient([server.url for server in servers], health_interval=0, max_retries=0, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_spreads_concurrent_requests(self):
+        servers = [self.start_server(latency=0.2) for _ in range(2)]
+        client = self.make_client(servers)
+        answers = []
+        threads = [threading.Thread(target=lambda: answers.append(client.generate(PAYLOAD)['response']))
+                   for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(answers), 6)
+        self.assertEqual([server.requests for server in servers], [3, 3])
+        self.assertEqual([endpoint['completed'] for endpoint in client.endpoint_stats()], [3, 3])
+
+    def test_failing_server_leaves_rotation(self):
+        failing = self.start_server(failing=True)
+        working = self.start_server()
+        client = self.make_client([failing, working])
+        for _ in range(5):
+            self.assertIn('response', client.generate(PAYLOAD))
+        # Only the first request reached the failing node; it failed over and the node was taken out
+        self.assertEqual(failing.requests, 1)
+        self.assertEqual(working.requests, 5)
+        failing_stats, working_stats = client.endpoint_stats()
+        self.assertFalse(failing_stats['healthy'])
+        self.assertEqual(failing_stats['failed'], 1)
+        self.assertTrue(working_stats['healthy'])
+
+    def test_health_check_removes_and_restores_nodes(self):
+        servers = [self.start_server() for _ in range(2)]
+        client = self.make_client(servers)
+        port = servers[1].server_address[1]
+        servers[1].stop()
+        client.check_health()
+        self.assertEqual([endpoint['healthy'] for endpoint in client.endpoint_stats()], [True, False])
+
+        # A server back on the same port is put back into rotation by the next probe
+        self.start_server(port=port)
+        client.check_health()
+        self.assertEqual([endpoint['healthy'] for endpoint in client.endpoint_stats()], [True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
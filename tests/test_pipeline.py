@@ -0,0 +1,47 @@
+import os
+import unittest
+
+from model.pipeline import Stage, StagedPipeline
+
+# The job whose detection kills its worker process
+DEADLY_JOB = 5
+
+
+def detect(args_list):
+    records = []
+    for (job,) in args_list:
+        if job == DEADLY_JOB:
+            os._exit(1)
+        records.append({'outcome': 'face', 'value': job})
+    return records
+
+
+def double(job, record):
+    record.update(final=True, outcome='processed', value=record['value'] * 2)
+    return record
+
+
+class StagedPipelineTest(unittest.TestCase):
+    """Runs StagedPipeline with real detection processes."""
+
+    def run_pipeline(self, jobs):
+        results = {}
+        pipeline = StagedPipeline(detect, [Stage(double, workers=2)], detect_workers=2)
+        pipeline.run(((job, (job,)) for job in jobs), lambda job, record: results.setdefault(job, record))
+        return results
+
+    def test_every_job_reaches_the_end(self):
+        results = self.run_pipeline([job for job in range(20) if job != DEADLY_JOB])
+        self.assertEqual(len(results), 19)
+        self.assertTrue(all(record['value'] == job * 2 for job, record in results.items()))
+
+    def test_dead_worker_fails_its_batches_only(self):
+        results = self.run_pipeline(range(30))
+        self.assertEqual(sorted(results), list(range(30)))
+        self.assertEqual(results[DEADLY_JOB]['outcome'], 'error')
+        # A fresh pool takes the jobs submitted after the death
+        self.assertEqual(results[29], {'final': True, 'outcome': 'processed', 'value': 58})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from model.shards import ShardWriter, sample_key
+
+
+def sample(index, size=1000):
+    return {'jpg': bytes([index % 256]) * size, 'txt': f"caption {index}".encode('utf-8'),
+            'json': json.dumps({'index': index}).encode('utf-8')}
+
+
+class ShardWriterTest(unittest.TestCase):
+    """ShardWriter's index offsets point at each member's bytes inside the tar shards."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open_writer(self, max_shard_bytes=1024 * 1024):
+        writer = ShardWriter(self.directory, max_shard_bytes)
+        self.addCleanup(writer.close)
+        return writer
+
+    def index_entries(self):
+        with open(os.path.join(self.directory, ShardWriter.INDEX_NAME)) as index:
+            return [json.loads(line) for line in index]
+
+    def test_read_round_trip(self):
+        writer = self.open_writer()
+        for i in range(3):
+            writer.add(f"face{i}", sample(i))
+        # Samples in the shard still being written are readable too
+        self.assertEqual(writer.read('face1'), sample(1))
+        self.assertIsNone(writer.read('missing'))
+        writer.close()
+        self.assertEqual(self.open_writer().read('face2'), sample(2))
+
+    def test_offsets_match_tar_members(self):
+        writer = self.open_writer()
+        for i in range(3):
+            writer.add(f"dir/face{i}", sample(i, size=700 + i))
+        writer.close()
+        for entry in self.index_entries():
+            path = os.path.join(self.directory, entry['shard'])
+            with tarfile.open(path) as tar, open(path, 'rb') as shard:
+                for extension, (offset, size) in entry['members'].items():
+                    member = tar.getmember(f"{entry['key']}.{extension}")
+                    self.assertEqual((member.offset_data, member.size), (offset, size))
+                    shard.seek(offset)
+                    self.assertEqual(shard.read(size), tar.extractfile(member).read())
+
+    def test_shards_roll_over_and_numbering_continues(self):
+        writer = self.open_writer(max_shard_bytes=5000)
+        for i in range(4):
+            writer.add(f"face{i}", sample(i, size=2000))
+        self.assertEqual(writer.shards_written, 4)
+        writer.close()
+        writer = self.open_writer(max_shard_bytes=5000)
+        writer.add('face4', sample(4, size=2000))
+        writer.close()
+        self.assertEqual([entry['shard'] for entry in self.index_entries()],
+                         [f"shard-{i:06d}.tar" for i in range(5)])
+        for i in range(5):
+            with tarfile.open(os.path.join(self.directory, f"shard-{i:06d}.tar")) as tar:
+                self.assertEqual(tar.getnames(), [f"face{i}.jpg", f"face{i}.txt", f"face{i}.json"])
+
+    def test_cut_off_index_line_is_skipped(self):
+        writer = self.open_writer()
+        writer.add('face0', sample(0))
+        writer.close()
+        with open(os.path.join(self.directory, ShardWriter.INDEX_NAME), 'a') as index:
+            index.write('{"key": "face1", "sha')
+        writer = self.open_writer()
+        self.assertEqual(writer.read('face0'), sample(0))
+        writer.add('face1', sample(1))
+        writer.close()
+        self.assertEqual(self.open_writer().read('face1'), sample(1))
+
+    def test_sample_key(self):
+        self.assertEqual(sample_key('IMG.0001.jpg'), 'IMG_0001')
+        self.assertEqual(sample_key(os.path.join('a', 'b c.png')), 'a/b_c')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -38,24 +38,16 @@ class MainWindow(QMainWindow):
         # Create tabs
         self.settings_tab = SettingsTab(self.image_processor)
         self.main_tab = MainTab(self.image_processor, self.settings_tab)
-        self.ai_sandbox_tab = AISandboxTab(self.image_processor)
+        self.ai_sandbox_tab = AISandboxTab(self.image_processor, self.settings_tab)
 
         self.tab_widget.addTab(self.main_tab, "Process")
         self.tab_widget.addTab(self.ai_sandbox_tab, "AI Sandbox")
         self.tab_widget.addTab(self.settings_tab, "Settings")
 
-        # Status Bar
+        # Status Bar; the AI settings report here once the model lookup has answered
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
-        self.status_bar.showMessage("Ready")
-
-        # Status Bar
-        self.status_bar = QStatusBar()
-        self.setStatusBar(self.status_bar)
-        self.status_bar.showMessage("Initializing...")
-
-        # Load initial model
-        self.load_initial_model()
+        self.status_bar.showMessage(f"Running:🟢 | Ollama: 🟡 | Connecting to {self.settings_tab.ai_settings.url_input.text()}...")
 
         # Apply stylesheet
         self.setStyleSheet("""
@@ -111,7 +103,3 @@ class MainWindow(QMainWindow):
                 background-color: #4CAF50;
             }
         """)
-    def load_initial_model(self):
-            self.settings_tab.ai_settings.load_initial_model()
-            model = self.settings_tab.ai_settings.model_select.currentText()
-            self.status_bar.showMessage(f"Running:🟢 | Ollama: 🟢 | Model: {model}")
\ No newline at end of file
@@ -0,0 +1,253 @@
+import bisect
+import os
+import threading
+from collections import OrderedDict
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+from PyQt5.QtGui import QColor, QImageReader
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QSize, QRect, pyqtSignal
+
+THUMBNAIL_SIZE = 100
+
+
+class ThumbnailCache(QObject):
+    """Decodes thumbnails on a background thread and keeps the most recent ones in memory.
+
+    ``get`` returns a cached QImage or queues the file and returns None;
+    ``thumbnail_ready`` fires once it has been decoded. Newest requests are
+    served first and old ones are dropped, so fast scrolling only decodes
+    what ends up on screen.
+    """
+
+    thumbnail_ready = pyqtSignal(str)
+
+    MAX_PENDING = 256
+
+    def __init__(self, max_items=500, size=THUMBNAIL_SIZE):
+        super().__init__()
+        self.max_items = max_items
+        self.size = size
+        self._images = OrderedDict()  # path -> QImage, or None if it could not be read
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def get(self, path):
+        with self._condition:
+            if path in self._images:
+                self._images.move_to_end(path)
+                return self._images[path]
+            self._pending[path] = True
+            self._pending.move_to_end(path)
+            while len(self._pending) > self.MAX_PENDING:
+                self._pending.popitem(last=False)
+            self._condition.notify()
+        return None
+
+    def is_missing(self, path):
+        # Decoded but unreadable, as opposed to not decoded yet
+        with self._condition:
+            return path in self._images and self._images[path] is None
+
+    def clear(self):
+        with self._condition:
+            self._images.clear()
+            self._pending.clear()
+
+    def _decode(self, path):
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            # Lets JPEG decode straight to the thumbnail size
+            reader.setScaledSize(size.scaled(self.size, self.size, Qt.KeepAspectRatio))
+        image = reader.read()
+        return None if image.isNull() else image
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                path, _ = self._pending.popitem(last=True)
+            image = self._decode(path)
+            with self._condition:
+                self._images[path] = image
+                while len(self._images) > self.max_items:
+                    self._images.popitem(last=False)
+            self.thumbnail_ready.emit(path)
+
+
+class ResultsModel(QAbstractTableModel):
+    """Processing results as a table model; thumbnails come from a ThumbnailCache.
+
+    Sorting and the result filter are done here on plain Python lists rather
+    than in a QSortFilterProxyModel, which would call ``data`` once per
+    comparison and takes seconds at 100k rows. Rows are kept in ascending
+    key order and reversed on the fly for descending sorts, so new results
+    are placed with a binary search.
+    """
+
+    COLUMNS = ["File Name", "Result", "Cropped", "Preview", "AI Response"]
+    PREVIEW_COLUMN = 3
+
+    _sort_keys = [
+        lambda row: row[0].lower(),
+        lambda row: row[1],
+        lambda row: row[3],
+        lambda row: row[1],
+        lambda row: row[4].lower()
+    ]
+
+    def __init__(self, thumbnails, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self.thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.output_dir = ""
+        self.output_name = lambda image_name: image_name
+        self._rows = []  # (image_name, success, reason, cropped, ai_response, preview_path)
+        self._visible = []  # indexes into _rows, in ascending sort order
+        self._keys = []  # sort key of each _visible entry
+        self._sort_column = -1
+        self._descending = False
+        self._result_filter = None
+
+    def set_output_dir(self, output_dir, output_name=None):
+        """``output_name`` maps an input file name to its exported file, when the output format differs."""
+        self.output_dir = output_dir
+        self.output_name = output_name or (lambda image_name: image_name)
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._visible = []
+        self._keys = []
+        self.thumbnails.clear()
+        self.endResetModel()
+
+    def _key(self, row):
+        # The row number breaks ties, which keeps equal rows in arrival order
+        if self._sort_column < 0:
+            return row
+        return self._sort_keys[self._sort_column](self._rows[row]), row
+
+    def _accepts(self, row):
+        return self._result_filter is None or self._rows[row][1] == self._result_filter
+
+    def _rebuild(self):
+        self.beginResetModel()
+        self._visible = [row for row in range(len(self._rows)) if self._accepts(row)]
+        if self._sort_column >= 0:
+            keyed = sorted((self._key(row), row) for row in self._visible)
+            self._keys = [key for key, _ in keyed]
+            self._visible = [row for _, row in keyed]
+        else:
+            self._keys = list(self._visible)
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sort_column = column
+        self._descending = order == Qt.DescendingOrder
+        self._rebuild()
+
+    def set_result_filter(self, success=None):
+        """Show only successful (True) or failed (False) results, or everything (None)."""
+        self._result_filter = success
+        self._rebuild()
+
+    def _display_row(self, position):
+        return len(self._visible) - 1 - position if self._descending else position
+
+    def append_results(self, results):
+        """Append ``(image_name, success, reason, cropped, ai_response)`` tuples."""
+        if self._sort_column < 0 and not self._descending:
+            # Arrival order: the whole batch goes to the end in one insert
+            first = len(self._rows)
+            self._rows.extend((image_name, success, reason, cropped, ai_response,
+                               os.path.join(self.output_dir, self.output_name(image_name)))
+                              for image_name, success, reason, cropped, ai_response in results)
+            accepted = [row for row in range(first, len(self._rows)) if self._accepts(row)]
+            if accepted:
+                self.beginInsertRows(QModelIndex(), len(self._visible), len(self._visible) + len(accepted) - 1)
+                self._visible.extend(accepted)
+                self._keys.extend(accepted)
+                self.endInsertRows()
+            return
+        for image_name, success, reason, cropped, ai_response in results:
+            row = len(self._rows)
+            self._rows.append((image_name, success, reason, cropped, ai_response,
+                               os.path.join(self.output_dir, self.output_name(image_name))))
+            if not self._accepts(row):
+                continue
+            key = self._key(row)
+            position = bisect.bisect_right(self._keys, key)
+            display_row = len(self._visible) - position if self._descending else position
+            self.beginInsertRows(QModelIndex(), display_row, display_row)
+            self._keys.insert(position, key)
+            self._visible.insert(position, row)
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._visible[self._display_row(index.row())]
+        image_name, success, reason, cropped, ai_response, preview_path = self._rows[row]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return image_name
+            if column == 1:
+                return "Yes" if success else "No"
+            if column == 2:
+                return "Yes" if cropped else "No"
+            if column == self.PREVIEW_COLUMN:
+                # Only success rows have an output file to preview
+                return "" if success and not self.thumbnails.is_missing(preview_path) else "No preview"
+            if column == 4:
+                return ai_response
+        elif role == Qt.DecorationRole and column == self.PREVIEW_COLUMN and success:
+            # Only called for rows the view paints, so off-screen thumbnails are never decoded
+            return self.thumbnails.get(preview_path)
+        elif role == Qt.BackgroundRole and column == 1:
+            return QColor(200, 255, 200) if success else QColor(255, 200, 200)
+        elif role == Qt.ToolTipRole and column in (0, 1):
+            return reason
+        return None
+
+    def on_thumbnail_ready(self, path):
+        # The view only repaints the visible part of the column
+        if self._visible:
+            self.dataChanged.emit(self.index(0, self.PREVIEW_COLUMN),
+                                  self.index(len(self._visible) - 1, self.PREVIEW_COLUMN),
+                                  [Qt.DecorationRole, Qt.DisplayRole])
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Paints the preview column's QImage centred in the cell."""
+
+    def paint(self, painter, option, index):
+        image = index.data(Qt.DecorationRole)
+        if image is None:
+            super().paint(painter, option, index)
+            return
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        size = image.size().scaled(option.rect.size(), Qt.KeepAspectRatio)
+        if size.width() > image.width() or size.height() > image.height():
+            size = image.size()
+        target = QRect(0, 0, size.width(), size.height())
+        target.moveCenter(option.rect.center())
+        painter.drawImage(target, image)
+
+    def sizeHint(self, option, index):
+        return QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
@@ -1,13 +1,23 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                              QLabel, QLineEdit, QFileDialog, QMessageBox, QTextEdit,
-                             QGroupBox, QFormLayout)
-import base64
+                             QGroupBox, QFormLayout, QListWidget, QListWidgetItem, QCheckBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QSplitter)
+from PyQt5.QtCore import Qt
 import os
+from model.model_comparison import ModelComparison
+
+RESULT_COLUMNS = ["Model", "Endpoint", "Status", "TTFT (s)", "Latency (s)", "Tokens/s", "Tokens", "Payload (KB)",
+                  "Load (s)"]
+
 
 class AISandboxTab(QWidget):
-    def __init__(self, image_processor):
+    def __init__(self, image_processor, settings_tab):
         super().__init__()
         self.image_processor = image_processor
+        self.settings_tab = settings_tab
+        self.comparison = ModelComparison()
+        self.targets = []
+        self.response_views = []
         self.init_ui()
 
     def init_ui(self):
@@ -23,34 +33,108 @@ class AISandboxTab(QWidget):
         image_group.setLayout(image_layout)
         layout.addWidget(image_group)
 
+        # Target selection group: every checked model runs on every checked endpoint
+        targets_group = QGroupBox("Models and Endpoints")
+        targets_layout = QHBoxLayout()
+        self.model_list = QListWidget()
+        self.model_list.setMaximumHeight(100)
+        self.endpoint_list = QListWidget()
+        self.endpoint_list.setMaximumHeight(100)
+        models_layout = QVBoxLayout()
+        models_layout.addWidget(QLabel("Models:"))
+        models_layout.addWidget(self.model_list)
+        endpoints_layout = QVBoxLayout()
+        endpoints_layout.addWidget(QLabel("Endpoints:"))
+        endpoints_layout.addWidget(self.endpoint_list)
+        targets_layout.addLayout(models_layout)
+        targets_layout.addLayout(endpoints_layout)
+        targets_group.setLayout(targets_layout)
+        layout.addWidget(targets_group)
+
         # AI options group
         options_group = QGroupBox("AI Options")
         options_layout = QFormLayout()
         self.prompt = QLineEdit("Describe the image.")
         self.temperature = QLineEdit("0.7")
         self.max_tokens = QLineEdit("1000")
+        self.sequential = QCheckBox()
+        self.sequential.setToolTip("Run one target at a time, so models on the same server don't share its GPU")
         options_layout.addRow("Prompt:", self.prompt)
         options_layout.addRow("Temperature:", self.temperature)
         options_layout.addRow("Max Tokens:", self.max_tokens)
+        options_layout.addRow("One at a Time:", self.sequential)
         options_group.setLayout(options_layout)
         layout.addWidget(options_group)
 
-        # Submit button
+        # Submit and stop buttons
+        button_layout = QHBoxLayout()
         self.submit_btn = QPushButton("Submit to AI")
-        layout.addWidget(self.submit_btn)
+        self.stop_btn = QPushButton("Stop")
+        self.stop_btn.setEnabled(False)
+        button_layout.addWidget(self.submit_btn)
+        button_layout.addWidget(self.stop_btn)
+        layout.addLayout(button_layout)
+
+        # Measurements group
+        results_group = QGroupBox("Latency Comparison")
+        results_layout = QVBoxLayout()
+        self.results_table = QTableWidget(0, len(RESULT_COLUMNS))
+        self.results_table.setHorizontalHeaderLabels(RESULT_COLUMNS)
+        self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.results_table.verticalHeader().setVisible(False)
+        self.results_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.results_table.setMaximumHeight(150)
+        results_layout.addWidget(self.results_table)
+        results_group.setLayout(results_layout)
+        layout.addWidget(results_group)
 
-        # Response area
+        # Response area, one column per target
         response_group = QGroupBox("AI Response")
         response_layout = QVBoxLayout()
-        self.response_text = QTextEdit()
-        self.response_text.setReadOnly(True)
-        response_layout.addWidget(self.response_text)
+        self.response_splitter = QSplitter(Qt.Horizontal)
+        response_layout.addWidget(self.response_splitter)
         response_group.setLayout(response_layout)
-        layout.addWidget(response_group)
+        layout.addWidget(response_group, 1)
 
         # Connect signals
         self.browse_btn.clicked.connect(self.browse_image)
         self.submit_btn.clicked.connect(self.submit_to_ai)
+        self.stop_btn.clicked.connect(self.comparison.stop)
+        self.comparison.response_update.connect(self.on_response_update)
+        self.comparison.target_finished.connect(self.on_target_finished)
+        self.comparison.target_failed.connect(self.on_target_failed)
+        self.comparison.comparison_failed.connect(self.on_comparison_failed)
+        self.comparison.comparison_finished.connect(self.on_comparison_finished)
+
+    def showEvent(self, event):
+        # The AI settings may have found new models or endpoints since the tab was last shown
+        super().showEvent(event)
+        self.load_targets()
+
+    def load_targets(self):
+        ai_settings = self.settings_tab.ai_settings
+        models = [ai_settings.model_select.itemText(i) for i in range(ai_settings.model_select.count())]
+        endpoints = [ai_settings.url_input.text()] + ai_settings.endpoints()
+        self.fill_list(self.model_list, models, [ai_settings.model_select.currentText()])
+        self.fill_list(self.endpoint_list, endpoints, endpoints[:1])
+
+    @staticmethod
+    def fill_list(list_widget, names, default_checked):
+        checked = {list_widget.item(i).text() for i in range(list_widget.count())
+                   if list_widget.item(i).checkState() == Qt.Checked} or set(default_checked)
+        list_widget.clear()
+        for name in dict.fromkeys(names):
+            if not name:
+                continue
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if name in checked else Qt.Unchecked)
+            list_widget.addItem(item)
+
+    @staticmethod
+    def checked_items(list_widget):
+        return [list_widget.item(i).text() for i in range(list_widget.count())
+                if list_widget.item(i).checkState() == Qt.Checked]
 
     def browse_image(self):
         image_file, _ = QFileDialog.getOpenFileName(self, "Select Image", "", "Image Files (*.png *.jpg *.jpeg *.webp)")
@@ -62,15 +146,65 @@ class AISandboxTab(QWidget):
         if not os.path.isfile(image_path):
             QMessageBox.warning(self, "No Image", "Please upload an image.")
             return
+        targets = [(url, model) for model in self.checked_items(self.model_list)
+                   for url in self.checked_items(self.endpoint_list)]
+        if not targets:
+            QMessageBox.warning(self, "No Models", "Please check at least one model and one endpoint.")
+            return
+        try:
+            options = {"temperature": float(self.temperature.text()), "num_predict": int(self.max_tokens.text())}
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Options", "Temperature and Max Tokens must be numbers.")
+            return
+
+        ai_settings = self.settings_tab.ai_settings.get_settings()
+        api_params = ai_settings['api_params']
+        try:
+            timeout = float(api_params.get('timeout', 120))
+        except ValueError:
+            timeout = 120
+        self.show_targets(targets)
+        started = self.comparison.start(image_path, self.prompt.text(), targets, options, ai_settings['payload'],
+                                        api_params.get('generate_uri', '/api/generate'), timeout,
+                                        self.sequential.isChecked())
+        if started:
+            self.submit_btn.setEnabled(False)
+            self.stop_btn.setEnabled(True)
+
+    def show_targets(self, targets):
+        self.targets = targets
+        self.results_table.setRowCount(len(targets))
+        for view in self.response_views:
+            view.deleteLater()
+        self.response_views = []
+        for row, (url, model) in enumerate(targets):
+            self.set_row(row, [model, url, "Running..."] + [""] * (len(RESULT_COLUMNS) - 3))
+            view = QTextEdit()
+            view.setReadOnly(True)
+            view.setPlaceholderText(f"{model} @ {url}")
+            self.response_splitter.addWidget(view)
+            self.response_views.append(view)
+
+    def set_row(self, row, values, first_column=0):
+        for column, value in enumerate(values, first_column):
+            self.results_table.setItem(row, column, QTableWidgetItem("-" if value is None else str(value)))
+
+    def on_response_update(self, index, text):
+        if index < len(self.response_views):
+            self.response_views[index].setPlainText(text)
+
+    def on_target_finished(self, index, result):
+        self.set_row(index, ["Done", result['ttft_s'], result['latency_s'], result['tokens_per_sec'],
+                             result['tokens'], round(result['payload_bytes'] / 1024, 1), result['load_s']], 2)
 
-        with open(image_path, "rb") as file:
-            image_base64 = base64.b64encode(file.read()).decode('utf-8')
+    def on_target_failed(self, index, error):
+        self.set_row(index, [f"Failed: {error}"], 2)
 
-        response = self.image_processor.analyze_image_content(
-            image_base64,
-            self.prompt.text(),
-            float(self.temperature.text()),
-            int(self.max_tokens.text())
-        )
+    def on_comparison_failed(self, error):
+        QMessageBox.warning(self, "AI Sandbox", f"Failed to prepare the image: {error}")
+        for row in range(len(self.targets)):
+            self.set_row(row, ["Not sent"], 2)
 
-        self.response_text.setText(f"AI Response: {response}")
\ No newline at end of file
+    def on_comparison_finished(self):
+        self.submit_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
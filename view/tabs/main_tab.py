@@ -1,17 +1,29 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                              QLabel, QLineEdit, QCheckBox, QProgressBar, QFileDialog,
-                             QMessageBox, QGroupBox, QFormLayout, QSpinBox, QInputDialog,
-                             QTableWidget, QTableWidgetItem, QHeaderView, QListWidget, QListWidgetItem)
-from PyQt5.QtGui import QColor, QPixmap
+                             QMessageBox, QGroupBox, QFormLayout, QSpinBox, QDoubleSpinBox, QInputDialog,
+                             QTableView, QHeaderView, QListWidget, QListWidgetItem, QComboBox,
+                             QTableWidget, QTableWidgetItem)
+from PyQt5.QtGui import QPixmap
 from PyQt5.QtCore import Qt, QSettings
 import os
+from model.folder_counter import FolderCounter
+from model.options import DEFAULT_IMAGE_EXTENSIONS
+from ..results_view import ResultsModel, ThumbnailCache, ThumbnailDelegate, THUMBNAIL_SIZE
 
 class MainTab(QWidget):
+    METRICS_COLUMNS = [("Step", None), ("Count", 'count'), ("Mean (ms)", 'mean_ms'), ("p50 (ms)", 'p50_ms'),
+                       ("p95 (ms)", 'p95_ms'), ("Max (ms)", 'max_ms')]
+    # Pipeline order; steps not listed here follow alphabetically
+    METRICS_STEPS = ['dedup_hash', 'decode', 'detect', 'crop', 'payload_encode', 'ai_request', 'output_encode',
+                     'write', 'total']
+
     def __init__(self, image_processor, settings_tab):
         super().__init__()
         self.image_processor = image_processor
         self.settings_tab = settings_tab
         self.settings = QSettings("AvniGashi", "FaceCroppingApp")
+        self.folder_counter = FolderCounter(DEFAULT_IMAGE_EXTENSIONS)
+        self.folder_counter.folder_counted.connect(self.show_folder_image_count)
         self.init_ui()
         self.load_settings()
 
@@ -31,6 +43,8 @@ class MainTab(QWidget):
         folder_btn_layout.addWidget(self.add_folder_btn)
         folder_btn_layout.addWidget(self.remove_folder_btn)
         folder_layout.addLayout(folder_btn_layout)
+        self.recursive = QCheckBox("Include Subfolders")
+        folder_layout.addWidget(self.recursive)
         folder_group.setLayout(folder_layout)
         layout.addWidget(folder_group)
 
@@ -68,6 +82,18 @@ class MainTab(QWidget):
         actions_layout.addRow("Crop Faces:", self.crop_faces)
         actions_layout.addRow("Generate Captions:", self.generate_captions)
         actions_layout.addRow("Caption Limit:", self.caption_limit)
+        self.resume = QCheckBox()
+        self.resume.setToolTip("Skip inputs already finished in the output directory with the same settings")
+        actions_layout.addRow("Resume Previous Run:", self.resume)
+        self.watch = QCheckBox()
+        self.watch.setToolTip("Keep running and process new or changed images as they land in the input folders")
+        actions_layout.addRow("Watch Folders:", self.watch)
+        self.watch_debounce = QDoubleSpinBox()
+        self.watch_debounce.setRange(0.1, 60)
+        self.watch_debounce.setSingleStep(0.5)
+        self.watch_debounce.setSuffix(" s")
+        self.watch_debounce.setToolTip("How long a file must stay unchanged before it is processed")
+        actions_layout.addRow("Watch Debounce:", self.watch_debounce)
         actions_group.setLayout(actions_layout)
         layout.addWidget(actions_group)
 
@@ -91,16 +117,62 @@ class MainTab(QWidget):
         preview_layout.addWidget(self.image_preview)
         process_layout.addLayout(preview_layout)
 
+        # Caption text as it streams in
+        caption_layout = QVBoxLayout()
+        self.live_caption_label = QLabel("Live Caption:")
+        caption_layout.addWidget(self.live_caption_label)
+        self.live_caption = QLabel()
+        self.live_caption.setWordWrap(True)
+        self.live_caption.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        self.live_caption.setFixedHeight(150)
+        self.live_caption.setStyleSheet("border: 1px solid #cccccc;")
+        caption_layout.addWidget(self.live_caption)
+        process_layout.addLayout(caption_layout)
+
         layout.addLayout(process_layout)
 
+        # Live per-step timings, queue depths and bytes moved
+        metrics_group = QGroupBox("Pipeline Metrics")
+        metrics_layout = QVBoxLayout()
+        self.metrics_table = QTableWidget(0, len(self.METRICS_COLUMNS))
+        self.metrics_table.setHorizontalHeaderLabels([label for label, _ in self.METRICS_COLUMNS])
+        self.metrics_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.metrics_table.verticalHeader().setVisible(False)
+        self.metrics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.metrics_table.setFixedHeight(140)
+        metrics_layout.addWidget(self.metrics_table)
+        self.metrics_label = QLabel("")
+        self.metrics_label.setWordWrap(True)
+        metrics_layout.addWidget(self.metrics_label)
+        metrics_group.setLayout(metrics_layout)
+        layout.addWidget(metrics_group)
+
         # Processed images table
         results_group = QGroupBox("Processing Results")
         results_layout = QVBoxLayout()
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(5)
-        self.results_table.setHorizontalHeaderLabels(["File Name", "Result", "Cropped", "Preview", "AI Response"])
+        results_filter_layout = QHBoxLayout()
+        results_filter_layout.addWidget(QLabel("Show:"))
+        self.results_filter = QComboBox()
+        self.results_filter.addItem("All Results", None)
+        self.results_filter.addItem("Successful", True)
+        self.results_filter.addItem("Failed", False)
+        self.results_filter.currentIndexChanged.connect(self.filter_results)
+        results_filter_layout.addWidget(self.results_filter)
+        results_filter_layout.addStretch()
+        results_layout.addLayout(results_filter_layout)
+        self.thumbnails = ThumbnailCache()
+        self.results_model = ResultsModel(self.thumbnails, self)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        self.results_table.setItemDelegateForColumn(ResultsModel.PREVIEW_COLUMN, ThumbnailDelegate(self.results_table))
+        # Start in arrival order; clicking a header sorts
+        self.results_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.results_table.setSortingEnabled(True)
         self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.results_table.verticalHeader().setVisible(False)
+        # Fixed row heights keep scrolling independent of the number of rows
+        self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.results_table.verticalHeader().setDefaultSectionSize(THUMBNAIL_SIZE + 4)
         results_layout.addWidget(self.results_table)
         results_group.setLayout(results_layout)
         layout.addWidget(results_group)
@@ -112,10 +184,15 @@ class MainTab(QWidget):
         # Connect signals
         self.add_folder_btn.clicked.connect(self.add_folder)
         self.remove_folder_btn.clicked.connect(self.remove_folder)
+        self.recursive.toggled.connect(self.on_recursive_changed)
         self.browse_btn.clicked.connect(self.browse_output)
         self.process_btn.clicked.connect(self.start_processing)
 
     def load_settings(self):
+        self.recursive.blockSignals(True)
+        self.recursive.setChecked(self.settings.value("recursive", False, type=bool))
+        self.recursive.blockSignals(False)
+
         # Load folders
         folders = self.settings.value("folders", [], type=list)
         for folder in folders:
@@ -131,6 +208,9 @@ class MainTab(QWidget):
         self.crop_faces.setChecked(self.settings.value("crop_faces", False, type=bool))
         self.generate_captions.setChecked(self.settings.value("generate_captions", False, type=bool))
         self.caption_limit.setValue(self.settings.value("caption_limit", 30, type=int))
+        self.resume.setChecked(self.settings.value("resume", False, type=bool))
+        self.watch.setChecked(self.settings.value("watch", False, type=bool))
+        self.watch_debounce.setValue(self.settings.value("watch_debounce", 2.0, type=float))
 
     def save_settings(self):
         # Save folders
@@ -145,6 +225,10 @@ class MainTab(QWidget):
         self.settings.setValue("crop_faces", self.crop_faces.isChecked())
         self.settings.setValue("generate_captions", self.generate_captions.isChecked())
         self.settings.setValue("caption_limit", self.caption_limit.value())
+        self.settings.setValue("resume", self.resume.isChecked())
+        self.settings.setValue("watch", self.watch.isChecked())
+        self.settings.setValue("watch_debounce", self.watch_debounce.value())
+        self.settings.setValue("recursive", self.recursive.isChecked())
 
     def add_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder to Process")
@@ -175,8 +259,21 @@ class MainTab(QWidget):
     def update_folder_image_count(self, item):
         folder = item.text().split(" (")[0]
         if os.path.isdir(folder):
-            image_count = len([f for f in os.listdir(folder) if f.lower().endswith(tuple(self.image_processor.allowed_file_types))])
-            item.setText(f"{folder} ({image_count} images)")
+            item.setText(f"{folder} (counting...)")
+            self.folder_counter.request(folder, self.recursive.isChecked())
+
+    def show_folder_image_count(self, folder, recursive, image_count):
+        if recursive != self.recursive.isChecked():
+            return
+        for i in range(self.folder_list.count()):
+            item = self.folder_list.item(i)
+            if item.text().split(" (")[0] == folder:
+                item.setText(f"{folder} ({image_count} images)")
+
+    def on_recursive_changed(self):
+        for i in range(self.folder_list.count()):
+            self.update_folder_image_count(self.folder_list.item(i))
+        self.save_settings()
 
     def browse_output(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Output Directory")
@@ -185,7 +282,8 @@ class MainTab(QWidget):
             self.save_settings()
 
     def start_processing(self):
-        if not self.image_processor.is_running():
+        # The thread's state, not the engine's flag: after a cancel the thread still drains in-flight work
+        if not self.image_processor.isRunning():
             folders = [self.folder_list.item(i).text().split(" (")[0] for i in range(self.folder_list.count())]
             if not folders:
                 QMessageBox.warning(self, "No Folders", "Please add at least one folder to process.")
@@ -202,13 +300,46 @@ class MainTab(QWidget):
                 QMessageBox.warning(self, "Invalid Input", "Please enter valid integers for minimum width, height, and caption limit.")
                 return
 
-            self.results_table.setRowCount(0)  # Clear the table
+            self.results_model.clear()
+            self.results_model.set_output_dir(self.output_dir.text(), self.image_processor.output_name)
 
             # Set API parameters and model
             api_params = self.settings_tab.ai_settings.get_settings()
+            cache_settings = api_params.pop('cache')
+            payload_settings = api_params.pop('payload')
+            request_settings = api_params.pop('requests')
             self.image_processor.set_api_params(api_params)
+            self.image_processor.set_payload_params(**payload_settings)
+            self.image_processor.set_request_params(**request_settings)
+            self.image_processor.set_cache_params(
+                cache_settings['enabled'],
+                max_size_mb=cache_settings['max_size_mb'],
+                max_age_days=cache_settings['max_age_days']
+            )
             self.image_processor.set_model(self.settings_tab.ai_settings.model_select.currentText())
 
+            general_settings = self.settings_tab.general_settings.get_settings()
+            self.image_processor.set_pipeline_params(
+                general_settings['detect_workers'],
+                general_settings['ai_workers'],
+                general_settings['write_workers']
+            )
+            self.image_processor.set_memory_params(general_settings['memory_budget_mb'])
+            self.image_processor.set_detection_params(
+                general_settings['detection_scale'],
+                general_settings['detection_max_edge'],
+                general_settings['detector_backend'],
+                general_settings['detect_batch_size']
+            )
+            self.image_processor.set_dedup_params(general_settings['dedup_mode'], general_settings['dedup_max_distance'])
+            self.image_processor.set_output_params(**general_settings['output'])
+            self.image_processor.set_export_params(**general_settings['export'])
+            metrics_settings = general_settings['metrics']
+            self.image_processor.set_metrics_params(
+                metrics_settings['prometheus_path'],
+                os.path.join(self.output_dir.text(), 'run.prof') if metrics_settings['profile'] else None
+            )
+
             self.image_processor.set_parameters(
                 folders,
                 self.output_dir.text(),
@@ -219,11 +350,19 @@ class MainTab(QWidget):
                 self.ai_validation.isChecked(),
                 self.crop_faces.isChecked()
             )
-            self.image_processor.progress_update.connect(self.update_progress)
-            self.image_processor.status_update.connect(self.update_status)
-            self.image_processor.image_processed.connect(self.update_image_list)
-            self.image_processor.processing_finished.connect(self.show_summary)
-            self.image_processor.current_image_update.connect(self.update_current_image)
+            self.image_processor.set_resume(self.resume.isChecked())
+            self.image_processor.set_scan_params(self.recursive.isChecked())
+            self.image_processor.set_watch_params(self.watch.isChecked(), self.watch_debounce.value())
+            # The session's connections end with this run
+            session = self.image_processor.create_session()
+            session.progress_update.connect(self.update_progress)
+            session.status_update.connect(self.update_status)
+            session.results_ready.connect(self.add_results)
+            session.processing_finished.connect(self.show_summary)
+            session.processing_failed.connect(self.show_failure)
+            session.current_image_update.connect(self.update_current_image)
+            session.caption_progress.connect(self.update_live_caption)
+            session.metrics_update.connect(self.update_metrics)
             self.image_processor.start()
             self.process_btn.setText("Cancel Processing")
 
@@ -233,14 +372,16 @@ class MainTab(QWidget):
             self.cancel_processing()
 
     def cancel_processing(self):
-        if self.image_processor.is_running():
+        if self.image_processor.isRunning():
             reply = QMessageBox.question(self, 'Cancel Processing',
                                          "Are you sure you want to cancel the processing?",
                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
                 self.image_processor.stop()
-                self.update_status("Processing canceled!")
-                self.process_btn.setText("Process Images")
+                self.update_status("Canceling...")
+                # Re-enabled by show_summary or show_failure once the run has finished
+                self.process_btn.setText("Canceling...")
+                self.process_btn.setEnabled(False)
 
     def update_progress(self, value):
         self.progress_bar.setValue(value)
@@ -248,45 +389,48 @@ class MainTab(QWidget):
     def update_status(self, message):
         self.status_label.setText(message)
 
-    def update_image_list(self, image_name, success, reason, cropped, ai_response):
-        row = self.results_table.rowCount()
-        self.results_table.insertRow(row)
-
-        # File Name
-        self.results_table.setItem(row, 0, QTableWidgetItem(image_name))
+    def add_results(self, results):
+        self.results_model.append_results(results)
 
-        # Result
-        result_item = QTableWidgetItem("Yes" if success else "No")
-        result_item.setBackground(QColor(200, 255, 200) if success else QColor(255, 200, 200))
-        self.results_table.setItem(row, 1, result_item)
+    def filter_results(self):
+        self.results_model.set_result_filter(self.results_filter.currentData())
 
-        # Cropped
-        self.results_table.setItem(row, 2, QTableWidgetItem("Yes" if cropped else "No"))
-
-        # Preview
-        preview_label = QLabel()
-        preview_pixmap = QPixmap(os.path.join(self.output_dir.text(), image_name))
-        if not preview_pixmap.isNull():
-            preview_pixmap = preview_pixmap.scaled(100, 100, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            preview_label.setPixmap(preview_pixmap)
-        else:
-            preview_label.setText("No preview")
-        self.results_table.setCellWidget(row, 3, preview_label)
+    def update_live_caption(self, image_name, caption):
+        self.live_caption_label.setText(f"Live Caption: {image_name}")
+        self.live_caption.setText(caption)
 
-        # AI Response
-        self.results_table.setItem(row, 4, QTableWidgetItem(ai_response))
-
-    def update_current_image(self, image_path):
-        # Update the current image label
+    def update_current_image(self, image_path, thumbnail):
+        # The worker sends a thumbnail of the pixels it already decoded
         self.current_image_label.setText(f"Current Image: {os.path.basename(image_path)}")
-
-        # Load and display the image preview
-        pixmap = QPixmap(image_path)
-        if not pixmap.isNull():
-            pixmap = pixmap.scaled(150, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.image_preview.setPixmap(pixmap)
-        else:
-            self.image_preview.setText("Unable to load image")
+        self.image_preview.setPixmap(QPixmap.fromImage(thumbnail))
+
+    def update_metrics(self, snapshot):
+        stages = snapshot['stages']
+        order = {name: i for i, name in enumerate(self.METRICS_STEPS)}
+        names = sorted(stages, key=lambda name: (order.get(name, len(order)), name))
+        self.metrics_table.setRowCount(len(names))
+        for row, name in enumerate(names):
+            for column, (_, key) in enumerate(self.METRICS_COLUMNS):
+                value = name if key is None else stages[name][key]
+                self.metrics_table.setItem(row, column, QTableWidgetItem(str(value)))
+        queues = ", ".join(f"{name} {queue['depth']} (max {queue['max']})"
+                           for name, queue in snapshot['queues'].items())
+        moved = ", ".join(f"{name} {count / (1024 * 1024):.1f} MB" for name, count in snapshot['bytes'].items())
+        gauges = snapshot.get('gauges', {})
+        decoded = (f"{gauges.get('decoded_bytes_in_flight', 0) / (1024 * 1024):.1f} MB "
+                   f"(peak {gauges.get('decoded_bytes_peak', 0) / (1024 * 1024):.1f} MB)")
+        self.metrics_label.setText(f"Queues: {queues or '-'}\nBytes: {moved or '-'}\nDecoded in flight: {decoded}")
+
+    def reset_process_button(self):
+        # The engine has reported its end; the thread only has to return before the next run can start
+        self.image_processor.wait()
+        self.process_btn.setText("Process Images")
+        self.process_btn.setEnabled(True)
+
+    def show_failure(self, error):
+        self.status_label.setText(f"Processing failed: {error}")
+        QMessageBox.critical(self, "Processing Failed", f"Processing stopped with an error:\n{error}")
+        self.reset_process_button()
 
     def show_summary(self, stats):
         summary = f"""
@@ -297,7 +441,18 @@ class MainTab(QWidget):
         Small Images Skipped: {stats['small_images']}
         Failed AI Validation: {stats['failed_validation']}
         Successfully Processed: {stats['processed_successfully']}
+        Errors: {stats.get('errors', 0)}
+        AI Cache Hits: {stats.get('cache_hits', 0)}
+        AI Bytes Sent per Image: {stats.get('ai_bytes_per_image', 0)}
+        AI Requests per Image: {stats.get('ai_requests_per_image', 0)}
+        Skipped (already done): {stats.get('skipped_resumed', 0)}
+        Near-Duplicates Skipped: {stats.get('duplicates', 0)}
+        Near-Duplicates Reused: {stats.get('duplicates_reused', 0)}
+        Output Bytes per Image: {stats.get('output_bytes_per_image', 0)}
+        Encode Time per Image: {stats.get('encode_ms_per_image', 0)} ms
+        Shards Written: {stats.get('shards_written', 0)}
+        Peak Decoded Memory: {stats.get('peak_decoded_mb', 0)} MB ({stats.get('memory_waits', 0)} waits, {stats.get('oversized_images', 0)} oversized)
         """
         self.status_label.setText(summary)
         QMessageBox.information(self, "Processing Complete", summary)
-        self.process_btn.setText("Process Images")
\ No newline at end of file
+        self.reset_process_button()
\ No newline at end of file
@@ -1,7 +1,9 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
-                             QLabel, QPushButton, QComboBox, QGroupBox, QFormLayout, QMessageBox)
-from PyQt5.QtCore import pyqtSignal
-import requests
+                             QLabel, QPushButton, QComboBox, QGroupBox, QFormLayout, QMessageBox,
+                             QCheckBox, QSpinBox, QListWidget, QInputDialog, QTableWidget,
+                             QTableWidgetItem, QHeaderView)
+from PyQt5.QtCore import pyqtSignal, QTimer
+from model.model_discovery import ModelDiscovery
 
 class AISettingsTab(QWidget):
     model_changed = pyqtSignal(str)
@@ -9,6 +11,8 @@ class AISettingsTab(QWidget):
     def __init__(self, image_processor):
         super().__init__()
         self.image_processor = image_processor
+        self.discovery = ModelDiscovery()
+        self._report_discovery_errors = False
         self.init_ui()
 
     def init_ui(self):
@@ -21,9 +25,35 @@ class AISettingsTab(QWidget):
         self.url_refresh_btn = QPushButton("Refresh")
         connection_layout.addRow("Base URL:", self.url_input)
         connection_layout.addRow("", self.url_refresh_btn)
+        self.endpoint_list = QListWidget()
+        self.endpoint_list.setMaximumHeight(80)
+        endpoint_btn_layout = QHBoxLayout()
+        self.add_endpoint_btn = QPushButton("Add Endpoint")
+        self.remove_endpoint_btn = QPushButton("Remove Endpoint")
+        endpoint_btn_layout.addWidget(self.add_endpoint_btn)
+        endpoint_btn_layout.addWidget(self.remove_endpoint_btn)
+        connection_layout.addRow("Additional Endpoints:", self.endpoint_list)
+        connection_layout.addRow("", endpoint_btn_layout)
         connection_group.setLayout(connection_layout)
         layout.addWidget(connection_group)
 
+        # Endpoint status group
+        status_group = QGroupBox("Endpoint Status")
+        status_layout = QVBoxLayout()
+        self.endpoint_table = QTableWidget()
+        self.endpoint_table.setColumnCount(7)
+        self.endpoint_table.setHorizontalHeaderLabels(["URL", "Healthy", "Outstanding", "Completed", "Failed",
+                                                       "Avg Latency (s)", "Requests/s"])
+        self.endpoint_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.endpoint_table.verticalHeader().setVisible(False)
+        self.endpoint_table.setMaximumHeight(120)
+        status_layout.addWidget(self.endpoint_table)
+        status_group.setLayout(status_layout)
+        layout.addWidget(status_group)
+        self.endpoint_timer = QTimer(self)
+        self.endpoint_timer.timeout.connect(self.update_endpoint_status)
+        self.endpoint_timer.start(2000)
+
         # Model selection group
         model_group = QGroupBox("Model Selection")
         model_layout = QHBoxLayout()
@@ -45,73 +75,160 @@ class AISettingsTab(QWidget):
             ('max_tokens', "1000"),
             ('top_p', "1"),
             ('frequency_penalty', "0"),
-            ('presence_penalty', "0")
+            ('presence_penalty', "0"),
+            ('timeout', "120"),
+            ('max_retries', "3"),
+            ('max_in_flight', "4")
         ]:
             self.api_params[param] = QLineEdit(default)
             params_layout.addRow(f"{param.capitalize()}:", self.api_params[param])
         params_group.setLayout(params_layout)
         layout.addWidget(params_group)
 
+        # Image payload group
+        payload_group = QGroupBox("Image Payload")
+        payload_layout = QFormLayout()
+        self.payload_max_edge = QSpinBox()
+        self.payload_max_edge.setRange(0, 10000)
+        self.payload_max_edge.setSpecialValueText("Original size")
+        self.payload_max_edge.setSuffix(" px")
+        self.payload_max_edge.setValue(1024)
+        self.payload_format = QComboBox()
+        self.payload_format.addItems(['jpeg', 'webp'])
+        self.payload_quality = QSpinBox()
+        self.payload_quality.setRange(1, 100)
+        self.payload_quality.setValue(90)
+        payload_layout.addRow("Max Long Edge:", self.payload_max_edge)
+        payload_layout.addRow("Format:", self.payload_format)
+        payload_layout.addRow("Quality:", self.payload_quality)
+        payload_group.setLayout(payload_layout)
+        layout.addWidget(payload_group)
+
+        # Request strategy group
+        requests_group = QGroupBox("Request Strategy")
+        requests_layout = QFormLayout()
+        self.combined_request = QCheckBox()
+        self.combined_request.setToolTip("Validate and caption with a single JSON request when both are enabled")
+        requests_layout.addRow("Combine Validation and Captioning:", self.combined_request)
+        self.validation_batch_size = QSpinBox()
+        self.validation_batch_size.setRange(1, 32)
+        self.validation_batch_size.setToolTip("Validate this many images per request")
+        requests_layout.addRow("Validation Batch Size:", self.validation_batch_size)
+        requests_group.setLayout(requests_layout)
+        layout.addWidget(requests_group)
+
+        # Response cache group
+        cache_group = QGroupBox("Response Cache")
+        cache_layout = QFormLayout()
+        self.cache_enabled = QCheckBox()
+        self.cache_enabled.setChecked(True)
+        self.cache_max_size = QSpinBox()
+        self.cache_max_size.setRange(1, 100000)
+        self.cache_max_size.setSuffix(" MB")
+        self.cache_max_size.setValue(256)
+        self.cache_max_age = QSpinBox()
+        self.cache_max_age.setRange(1, 3650)
+        self.cache_max_age.setSuffix(" days")
+        self.cache_max_age.setValue(30)
+        cache_layout.addRow("Enabled:", self.cache_enabled)
+        cache_layout.addRow("Max Size:", self.cache_max_size)
+        cache_layout.addRow("Max Age:", self.cache_max_age)
+        cache_group.setLayout(cache_layout)
+        layout.addWidget(cache_group)
+
         # Connect signals
         self.url_refresh_btn.clicked.connect(self.refresh_url)
+        self.add_endpoint_btn.clicked.connect(self.add_endpoint)
+        self.remove_endpoint_btn.clicked.connect(self.remove_endpoint)
         self.model_refresh_btn.clicked.connect(self.refresh_models)
         self.model_select.currentTextChanged.connect(self.on_model_changed)
+        self.discovery.models_loaded.connect(self.on_models_loaded)
+        self.discovery.discovery_failed.connect(self.on_discovery_failed)
 
         # Load initial model
         self.load_initial_model()
 
     def load_initial_model(self):
-        try:
-            response = requests.get(f"{self.url_input.text()}/api/tags")
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                self.model_select.clear()
-                clip_model = None
-                for model in models:
-                    self.model_select.addItem(model['name'])
-                    if clip_model is None and 'clip' in model.get('details', {}).get('families', []):
-                        clip_model = model['name']
-                if clip_model:
-                    self.model_select.setCurrentText(clip_model)
-                    self.image_processor.set_model(clip_model)
-                    self.update_status_bar(f"Running:🟢 | Ollama: 🟢 | Model: {clip_model}")
-                else:
-                    QMessageBox.warning(self, "Model Loading", "No CLIP-capable model found. Please pull a suitable model.")
-            else:
-                raise Exception(f"Server returned status code {response.status_code}")
-        except Exception as e:
-            QMessageBox.warning(self, "Model Loading Error", f"Failed to load initial model: {str(e)}")
-            self.update_status_bar(f"Running:🔴 | Ollama: 🔴 | Failed to connect to {self.url_input.text()}")
+        # The list from the last session shows immediately; the server's answer replaces it
+        self.show_models(self.discovery.cached(self.url_input.text()))
+        self._report_discovery_errors = False
+        self.discovery.refresh(self.url_input.text())
 
     def refresh_url(self):
-        try:
-            response = requests.get(self.url_input.text())
-            if response.status_code == 200:
-                self.refresh_models()
-                self.update_status_bar(f"Running:🟢 | Ollama: 🟢 | Model: {self.model_select.currentText()}")
-            else:
-                raise Exception(f"Server returned status code {response.status_code}")
-        except Exception as e:
-            QMessageBox.warning(self, "Connection Error", f"Failed to connect to the server: {str(e)}")
-            self.update_status_bar(f"Running:🔴 | Ollama: 🔴 | Failed to connect to {self.url_input.text()}")
+        self.update_status_bar(f"Running:🟢 | Ollama: 🟡 | Connecting to {self.url_input.text()}...")
+        self.refresh_models()
 
     def refresh_models(self):
-        try:
-            response = requests.get(f"{self.url_input.text()}/api/tags")
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                self.model_select.clear()
-                for model in models:
-                    self.model_select.addItem(model['name'])
-                self.update_status_bar(f"Running:🟢 | Ollama: 🟢 | Model: {self.model_select.currentText()}")
-            else:
-                raise Exception(f"Server returned status code {response.status_code}")
-        except Exception as e:
-            QMessageBox.warning(self, "Model Refresh Error", f"Failed to refresh models: {str(e)}")
-            self.update_status_bar(f"Running:🔴 | Ollama: 🔴 | Failed to connect to {self.url_input.text()}")
+        self._report_discovery_errors = True
+        self.discovery.refresh(self.url_input.text())
+
+    def show_models(self, models):
+        if not models:
+            return
+        current = self.model_select.currentText()
+        names = [model['name'] for model in models]
+        self.model_select.blockSignals(True)
+        self.model_select.clear()
+        self.model_select.addItems(names)
+        self.model_select.blockSignals(False)
+        if current in names:
+            self.model_select.setCurrentText(current)
+        else:
+            clip_models = [model['name'] for model in models if 'clip' in model['families']]
+            self.model_select.setCurrentText(clip_models[0] if clip_models else names[0])
+        if self.model_select.currentText() != current:
+            self.on_model_changed(self.model_select.currentText())
+
+    def on_models_loaded(self, url, models):
+        if url != self.url_input.text():
+            # Answer for a URL that has been edited since
+            return
+        self.show_models(models)
+        if not any('clip' in model['families'] for model in models):
+            message = "No CLIP-capable model found. Please pull a suitable model."
+            if self._report_discovery_errors:
+                QMessageBox.warning(self, "Model Loading", message)
+            self.update_status_bar(f"Running:🟢 | Ollama: 🟢 | {message}")
+            return
+        self.update_status_bar(f"Running:🟢 | Ollama: 🟢 | Model: {self.model_select.currentText()}")
+
+    def on_discovery_failed(self, url, error):
+        if url != self.url_input.text():
+            return
+        if self._report_discovery_errors:
+            QMessageBox.warning(self, "Connection Error", f"Failed to load models: {error}")
+        self.update_status_bar(f"Running:🔴 | Ollama: 🔴 | Failed to connect to {url}")
+
+    def add_endpoint(self):
+        url, ok = QInputDialog.getText(self, "Add Endpoint", "Ollama Base URL:", QLineEdit.Normal, "http://")
+        if ok and url.strip():
+            self.endpoint_list.addItem(url.strip())
+
+    def remove_endpoint(self):
+        current_item = self.endpoint_list.currentItem()
+        if current_item:
+            self.endpoint_list.takeItem(self.endpoint_list.row(current_item))
+        else:
+            QMessageBox.information(self, "No Selection", "Please select an endpoint to remove.")
+
+    def endpoints(self):
+        return [self.endpoint_list.item(i).text() for i in range(self.endpoint_list.count())]
+
+    def update_endpoint_status(self):
+        if not self.isVisible():
+            return
+        stats = self.image_processor.endpoint_stats()
+        self.endpoint_table.setRowCount(len(stats))
+        for row, endpoint in enumerate(stats):
+            values = [endpoint['url'], "Yes" if endpoint['healthy'] else "No", endpoint['outstanding'],
+                      endpoint['completed'], endpoint['failed'],
+                      "-" if endpoint['avg_latency'] is None else endpoint['avg_latency'],
+                      endpoint['requests_per_sec']]
+            for column, value in enumerate(values):
+                self.endpoint_table.setItem(row, column, QTableWidgetItem(str(value)))
 
     def on_model_changed(self, model):
-        self.image_processor.set_model(model)
+        # The engine gets the model when a run starts, so changing it here doesn't load OpenCV
         self.model_changed.emit(model)
         self.update_status_bar(f"Running:🟢 | Ollama: 🟢 | Model: {model}")
 
@@ -123,13 +240,41 @@ class AISettingsTab(QWidget):
     def get_settings(self):
         return {
             'url': self.url_input.text(),
+            'endpoints': self.endpoints(),
             'model': self.model_select.currentText(),
-            'api_params': {param: widget.text() for param, widget in self.api_params.items()}
+            'api_params': {param: widget.text() for param, widget in self.api_params.items()},
+            'payload': {
+                'max_edge': self.payload_max_edge.value(),
+                'image_format': self.payload_format.currentText(),
+                'quality': self.payload_quality.value()
+            },
+            'requests': {
+                'combined_request': self.combined_request.isChecked(),
+                'validation_batch_size': self.validation_batch_size.value()
+            },
+            'cache': {
+                'enabled': self.cache_enabled.isChecked(),
+                'max_size_mb': self.cache_max_size.value(),
+                'max_age_days': self.cache_max_age.value()
+            }
         }
 
     def load_settings(self, settings):
         self.url_input.setText(settings.get('url', 'http://localhost:11434'))
+        self.endpoint_list.clear()
+        self.endpoint_list.addItems(settings.get('endpoints', []))
         self.model_select.setCurrentText(settings.get('model', ''))
         for param, value in settings.get('api_params', {}).items():
             if param in self.api_params:
-                self.api_params[param].setText(str(value))
\ No newline at end of file
+                self.api_params[param].setText(str(value))
+        payload = settings.get('payload', {})
+        self.payload_max_edge.setValue(int(payload.get('max_edge', 1024)))
+        self.payload_format.setCurrentText(payload.get('image_format', 'jpeg'))
+        self.payload_quality.setValue(int(payload.get('quality', 90)))
+        request_settings = settings.get('requests', {})
+        self.combined_request.setChecked(request_settings.get('combined_request', False))
+        self.validation_batch_size.setValue(int(request_settings.get('validation_batch_size', 1)))
+        cache = settings.get('cache', {})
+        self.cache_enabled.setChecked(cache.get('enabled', True))
+        self.cache_max_size.setValue(int(cache.get('max_size_mb', 256)))
+        self.cache_max_age.setValue(int(cache.get('max_age_days', 30)))
\ No newline at end of file
@@ -1,9 +1,14 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QLabel, QGroupBox, QFormLayout
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, QLabel, QGroupBox, QFormLayout, QSpinBox, QComboBox,
+                             QCheckBox)
+import os
+from model.options import DEDUP_MODES, OUTPUT_FORMATS
+from model.shards import EXPORT_MODES
 
 class GeneralSettingsTab(QWidget):
     def __init__(self, image_processor):
         super().__init__()
         self.image_processor = image_processor
+        self._backends_loaded = False
         self.init_ui()
 
     def init_ui(self):
@@ -16,14 +21,186 @@ class GeneralSettingsTab(QWidget):
         file_types_layout.addRow("File Extensions:", self.allowed_file_types)
         file_types_group.setLayout(file_types_layout)
         layout.addWidget(file_types_group)
+
+        # Pipeline workers group
+        pipeline_group = QGroupBox("Pipeline Workers")
+        pipeline_layout = QFormLayout()
+        self.detect_workers = QSpinBox()
+        self.detect_workers.setRange(0, 256)
+        self.detect_workers.setValue(os.cpu_count() or 1)
+        self.ai_workers = QSpinBox()
+        self.ai_workers.setRange(1, 64)
+        self.ai_workers.setValue(4)
+        self.write_workers = QSpinBox()
+        self.write_workers.setRange(1, 64)
+        self.write_workers.setValue(2)
+        self.memory_budget = QSpinBox()
+        self.memory_budget.setRange(0, 1000000)
+        self.memory_budget.setSpecialValueText("Unlimited")
+        self.memory_budget.setSuffix(" MB")
+        self.memory_budget.setValue(2048)
+        self.memory_budget.setToolTip("Images wait before decoding while their estimated decoded pixels would exceed this; "
+                                      "larger images run alone")
+        pipeline_layout.addRow("Detection Processes:", self.detect_workers)
+        pipeline_layout.addRow("AI Threads:", self.ai_workers)
+        pipeline_layout.addRow("Writer Threads:", self.write_workers)
+        pipeline_layout.addRow("Memory Budget:", self.memory_budget)
+        pipeline_group.setLayout(pipeline_layout)
+        layout.addWidget(pipeline_group)
+
+        # Detection resolution group
+        detection_group = QGroupBox("Face Detection")
+        detection_layout = QFormLayout()
+        self.detection_scale = QComboBox()
+        for label, scale in [("Full", 1), ("1/2", 2), ("1/4", 4), ("1/8", 8)]:
+            self.detection_scale.addItem(label, scale)
+        self.detection_max_edge = QSpinBox()
+        self.detection_max_edge.setRange(0, 20000)
+        self.detection_max_edge.setSpecialValueText("Unlimited")
+        self.detection_max_edge.setSuffix(" px")
+        self.detector_backend = QComboBox()
+        # The full list needs OpenCV, so it is filled in when the tab is first shown
+        self.detector_backend.addItem('haar')
+        self.detect_batch_size = QSpinBox()
+        self.detect_batch_size.setRange(1, 256)
+        self.detect_batch_size.setValue(4)
+        detection_layout.addRow("Detector:", self.detector_backend)
+        detection_layout.addRow("Batch Size:", self.detect_batch_size)
+        detection_layout.addRow("Decode Scale:", self.detection_scale)
+        detection_layout.addRow("Max Long Edge:", self.detection_max_edge)
+        detection_group.setLayout(detection_layout)
+        layout.addWidget(detection_group)
+
+        # Near-duplicate group
+        dedup_group = QGroupBox("Near-Duplicates")
+        dedup_layout = QFormLayout()
+        self.dedup_mode = QComboBox()
+        for label, mode in zip(["Off", "Skip", "Reuse Earlier Result"], DEDUP_MODES):
+            self.dedup_mode.addItem(label, mode)
+        self.dedup_mode.setToolTip("Compare a perceptual hash of each input with everything already in the output directory")
+        self.dedup_max_distance = QSpinBox()
+        self.dedup_max_distance.setRange(0, 32)
+        self.dedup_max_distance.setValue(4)
+        self.dedup_max_distance.setSuffix(" bits")
+        dedup_layout.addRow("Mode:", self.dedup_mode)
+        dedup_layout.addRow("Max Hash Distance:", self.dedup_max_distance)
+        dedup_group.setLayout(dedup_layout)
+        layout.addWidget(dedup_group)
+
+        # Output encoding group
+        output_group = QGroupBox("Output Encoding")
+        output_layout = QFormLayout()
+        self.output_format = QComboBox()
+        for label, image_format in zip(["Same as Input", "JPEG", "WebP", "PNG"], OUTPUT_FORMATS):
+            self.output_format.addItem(label, image_format)
+        self.output_quality = QSpinBox()
+        self.output_quality.setRange(1, 100)
+        self.output_quality.setValue(95)
+        self.output_quality.setToolTip("Used for JPEG and WebP output")
+        self.png_compression = QSpinBox()
+        self.png_compression.setRange(0, 9)
+        self.png_compression.setValue(1)
+        self.png_compression.setToolTip("Higher levels give smaller files but take longer to write")
+        output_layout.addRow("Format:", self.output_format)
+        output_layout.addRow("Quality:", self.output_quality)
+        output_layout.addRow("PNG Compression:", self.png_compression)
+        output_group.setLayout(output_layout)
+        layout.addWidget(output_group)
+
+        # Export group
+        export_group = QGroupBox("Export")
+        export_layout = QFormLayout()
+        self.export_mode = QComboBox()
+        for label, mode in zip(["Loose Files", "Tar Shards (WebDataset)"], EXPORT_MODES):
+            self.export_mode.addItem(label, mode)
+        self.export_mode.setToolTip("Shards bundle image, caption and metadata per sample under shards/ in the output directory")
+        self.shard_max_mb = QSpinBox()
+        self.shard_max_mb.setRange(1, 100000)
+        self.shard_max_mb.setValue(1024)
+        self.shard_max_mb.setSuffix(" MB")
+        export_layout.addRow("Mode:", self.export_mode)
+        export_layout.addRow("Max Shard Size:", self.shard_max_mb)
+        export_group.setLayout(export_layout)
+        layout.addWidget(export_group)
+
+        # Metrics export group
+        metrics_group = QGroupBox("Metrics")
+        metrics_layout = QFormLayout()
+        self.prometheus_path = QLineEdit()
+        self.prometheus_path.setPlaceholderText("Off")
+        self.prometheus_path.setToolTip("Prometheus textfile kept up to date during a run, e.g. for the node exporter")
+        self.profile_run = QCheckBox("Write run.prof to the output directory")
+        self.profile_run.setToolTip("Profile the run with cProfile; slows processing down")
+        metrics_layout.addRow("Prometheus File:", self.prometheus_path)
+        metrics_layout.addRow("Profile:", self.profile_run)
+        metrics_group.setLayout(metrics_layout)
+        layout.addWidget(metrics_group)
         # Add other general settings here
 
+    def load_detector_backends(self):
+        if self._backends_loaded:
+            return
+        from model.detection import available_backends
+        current = self.detector_backend.currentText()
+        self.detector_backend.clear()
+        self.detector_backend.addItems(available_backends())
+        self.detector_backend.setCurrentText(current)
+        self._backends_loaded = True
+
+    def showEvent(self, event):
+        self.load_detector_backends()
+        super().showEvent(event)
+
     def load_settings(self, settings):
+        self.load_detector_backends()
         self.allowed_file_types.setText(', '.join(settings.get('allowed_file_types', ['.png', '.jpg', '.jpeg', '.webp'])))
+        self.detect_workers.setValue(int(settings.get('detect_workers', os.cpu_count() or 1)))
+        self.ai_workers.setValue(int(settings.get('ai_workers', 4)))
+        self.write_workers.setValue(int(settings.get('write_workers', 2)))
+        self.memory_budget.setValue(int(settings.get('memory_budget_mb', 2048)))
+        self.detection_scale.setCurrentIndex(max(0, self.detection_scale.findData(int(settings.get('detection_scale', 1)))))
+        self.detection_max_edge.setValue(int(settings.get('detection_max_edge', 0)))
+        self.detector_backend.setCurrentText(settings.get('detector_backend', 'haar'))
+        self.detect_batch_size.setValue(int(settings.get('detect_batch_size', 4)))
+        self.dedup_mode.setCurrentIndex(max(0, self.dedup_mode.findData(settings.get('dedup_mode', 'off'))))
+        self.dedup_max_distance.setValue(int(settings.get('dedup_max_distance', 4)))
+        output = settings.get('output', {})
+        self.output_format.setCurrentIndex(max(0, self.output_format.findData(output.get('image_format', 'source'))))
+        self.output_quality.setValue(int(output.get('quality', 95)))
+        self.png_compression.setValue(int(output.get('png_compression', 1)))
+        export = settings.get('export', {})
+        self.export_mode.setCurrentIndex(max(0, self.export_mode.findData(export.get('mode', 'files'))))
+        self.shard_max_mb.setValue(int(export.get('shard_max_mb', 1024)))
+        metrics = settings.get('metrics', {})
+        self.prometheus_path.setText(metrics.get('prometheus_path') or "")
+        self.profile_run.setChecked(bool(metrics.get('profile', False)))
         # Load other general settings here
 
     def get_settings(self):
         return {
-            'allowed_file_types': [ft.strip() for ft in self.allowed_file_types.text().split(',')]
+            'allowed_file_types': [ft.strip() for ft in self.allowed_file_types.text().split(',')],
+            'detect_workers': self.detect_workers.value(),
+            'ai_workers': self.ai_workers.value(),
+            'write_workers': self.write_workers.value(),
+            'memory_budget_mb': self.memory_budget.value(),
+            'detection_scale': self.detection_scale.currentData(),
+            'detection_max_edge': self.detection_max_edge.value(),
+            'detector_backend': self.detector_backend.currentText(),
+            'detect_batch_size': self.detect_batch_size.value(),
+            'dedup_mode': self.dedup_mode.currentData(),
+            'dedup_max_distance': self.dedup_max_distance.value(),
+            'output': {
+                'image_format': self.output_format.currentData(),
+                'quality': self.output_quality.value(),
+                'png_compression': self.png_compression.value()
+            },
+            'export': {
+                'mode': self.export_mode.currentData(),
+                'shard_max_mb': self.shard_max_mb.value()
+            },
+            'metrics': {
+                'prometheus_path': self.prometheus_path.text().strip() or None,
+                'profile': self.profile_run.isChecked()
+            }
             # Add other general settings here
         }